@@ -526,6 +526,49 @@ class RecordList(DehydratedTrustedData):
         return "<RecordList ({} records)>".format(len(self._records))
 
 
+def _capture_call_context():
+    # Returns a function that makes another thread's outbound calls belong to the current server call
+    try:
+        from anvil._threaded_server import capture_call_info
+    except ImportError:
+        return lambda: None
+    return capture_call_info()
+
+
+def _fetch_page(get_next_page, cap):
+    if get_next_page:
+        return get_next_page(cap)
+    return anvil.server.call("ext.iter:" + cap.scope[1], cap)
+
+
+_END_OF_PAGES = object()
+
+
+def _prefetch_pages(cap, fetch, pages, stopped, restore_call_context):
+    # Runs on a background thread. This holds no reference to the iterator, so an abandoned
+    # iterator can be garbage-collected, which stops the thread.
+    import queue
+
+    def put(item):
+        # Give up if the consumer has gone away
+        while not stopped.is_set():
+            try:
+                pages.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    restore_call_context()
+    try:
+        while cap and not stopped.is_set():
+            data, cap = fetch(cap)
+            put(data)
+    except Exception as e:
+        put(e)
+    else:
+        put(_END_OF_PAGES)
+
+
 @anvil.server.portable_class
 class LazyIterable:
     def __init__(self, cap_first_page, first_page=None, cap_second_page=None, get_next_page=None):
@@ -537,9 +580,9 @@ class LazyIterable:
 
     def __serialize__(self, si):
         if si.local_is_trusted:
-            return self.cap_this_page, self._first_page, self._cap_second_page
+            return self._cap_first_page, self._first_page, self._cap_second_page
         else:
-            return self.cap_this_page, None, None
+            return self._cap_first_page, None, None
 
     def __deserialize__(self, data, si):
         self._get_next_page = None
@@ -550,10 +593,22 @@ class LazyIterable:
             self._first_page = self._cap_second_page = None
 
     def __iter__(self):
+        return self._iter()
+
+    def iter_prefetch(self, pages=1):
+        """Iterate, fetching up to `pages` pages ahead of the consumer on a background thread.
+        Only available on the server; elsewhere this is the same as iter().
+        Use the iterator in a with block (or call close()) to stop fetching if you stop iterating early."""
+        return self._iter(pages)
+
+    def _iter(self, read_ahead=0):
         if self._first_page is not None:
-            return self.Iterator(self._first_page, self._cap_second_page, self._get_next_page)
+            first_page, next_page_cap = self._first_page, self._cap_second_page
         else:
-            return self.Iterator([], self._cap_first_page, self._get_next_page)
+            first_page, next_page_cap = [], self._cap_first_page
+        if read_ahead > 0 and next_page_cap and anvil.is_server_side():
+            return self.PrefetchingIterator(first_page, next_page_cap, self._get_next_page, read_ahead)
+        return self.Iterator(first_page, next_page_cap, self._get_next_page)
 
     def __repr__(self):
         return f"<LazyIterable({self._cap_first_page.scope[1]}): at {self._cap_first_page.scope[2:]} with {len(self._first_page)} items cached, next page = {self._cap_second_page}>"
@@ -564,6 +619,21 @@ class LazyIterable:
             self._next_page_cap = next_page_cap
             self._get_next_page = get_next_page
 
+        def __iter__(self):
+            return self
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            self.close()
+
+        def close(self):
+            pass
+
+        def _fetch(self, cap):
+            return _fetch_page(self._get_next_page, cap)
+
         def __next__(self):
             while True:
                 try:
@@ -571,10 +641,49 @@ class LazyIterable:
                 except StopIteration:
                     if not self._next_page_cap:
                         raise
-                    if self._get_next_page:
-                        next_data, self._next_page_cap = self._get_next_page(self._next_page_cap)
-                    else:
-                        next_data, self._next_page_cap = anvil.server.call("ext.iter:" + self._next_page_cap.scope[1],
-                                                                           self._next_page_cap)
+                    next_data, self._next_page_cap = self._fetch(self._next_page_cap)
                     self._page_iter = iter(next_data)
 
+    class PrefetchingIterator(Iterator):
+        # A background thread fetches pages into a bounded queue while we're consuming the current one.
+        # If fetching fails, the error is raised when the consumer reaches the page that failed.
+        # Stop it early with close() (or a with block); abandoned iterators stop it when they're collected.
+
+        def __init__(self, first_page, next_page_cap, get_next_page, read_ahead):
+            import functools
+            import queue
+            import threading
+
+            LazyIterable.Iterator.__init__(self, first_page, None, get_next_page)
+            self._pages = queue.Queue(read_ahead)
+            self._stopped = threading.Event()
+            self._finished = False
+            threading.Thread(
+                target=_prefetch_pages,
+                args=(next_page_cap, functools.partial(_fetch_page, get_next_page), self._pages, self._stopped,
+                      _capture_call_context()),
+                daemon=True,
+            ).start()
+
+        def __next__(self):
+            while True:
+                try:
+                    return self._page_iter.__next__()
+                except StopIteration:
+                    if self._finished:
+                        raise
+                    item = self._pages.get()
+                    if item is _END_OF_PAGES or isinstance(item, Exception):
+                        self.close()
+                        if item is _END_OF_PAGES:
+                            raise
+                        raise item
+                    self._page_iter = iter(item)
+
+        def close(self):
+            self._finished = True
+            self._stopped.set()
+
+        def __del__(self):
+            self._stopped.set()
+
@@ -1,6 +1,6 @@
 __author__ = 'meredydd'
 
-import random, string
+import os, random, string
 
 import anvil
 from . import _server
@@ -14,26 +14,67 @@ def _gen_id():
 # requestId->_IncomingRequest
 _incoming_requests = {}
 
+# Incoming media bigger than this is written to a temporary file rather than held in memory
+SPOOL_THRESHOLD = 8 * 1024 * 1024
+MEDIA_CHUNK_SIZE = 65536
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
 
 class StreamingMedia(anvil.Media):
     def __init__(self, content_type, name):
         self._content_type = content_type
         self._content = b''
         self._incoming_content = []
+        self._length = 0
+        self._spool = None
+        self._spool_path = None
         self._complete = False
         self._name = name
         self._error = None
 
+    def _start_spooling(self):
+        import tempfile
+        fd, self._spool_path = tempfile.mkstemp(prefix="anvil-media-")
+        self._spool = os.fdopen(fd, "wb")
+        for data in self._incoming_content:
+            self._spool.write(data)
+        self._incoming_content = []
+
     def add_content(self, data, last_chunk=False):
-        self._incoming_content.append(data)
+        self._length += len(data)
+        if self._spool is None and self._spool_path is None and self._length > SPOOL_THRESHOLD:
+            self._start_spooling()
+        if self._spool is not None:
+            self._spool.write(data)
+        else:
+            self._incoming_content.append(data)
         if last_chunk:
-            self._content = b''.join(self._incoming_content)
-            self._incoming_content = []
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+            else:
+                self._content = b''.join(self._incoming_content)
+                self._incoming_content = []
             self._complete = True
 
     def set_error(self, error):
         self._error = error
         self._complete = True
+        if self._spool is not None:
+            self._spool.close()
+            self._spool = None
+
+    def __del__(self):
+        if self._spool is not None:
+            self._spool.close()
+        if self._spool_path is not None:
+            _remove_file(self._spool_path)
 
     def is_complete(self):
         return self._complete
@@ -44,8 +85,25 @@ class StreamingMedia(anvil.Media):
     def get_bytes(self):
         if self._error:
             raise _server._deserialise_exception(self._error)
+        if self._spool_path is not None:
+            with self._open() as f:
+                return f.read()
         return self._content
 
+    def get_length(self):
+        if self._error:
+            raise _server._deserialise_exception(self._error)
+        return self._length
+
+    def _open(self):
+        # A binary file object, so large media can be read without loading it all into memory
+        if self._error:
+            raise _server._deserialise_exception(self._error)
+        if self._spool_path is not None:
+            return open(self._spool_path, "rb")
+        import io
+        return io.BytesIO(self._content)
+
     def get_url(self):
         return None
 
@@ -140,6 +198,19 @@ def release_reqresps():
         reqresp.maybe_execute()
 
 
+def _media_chunks(m):
+    # Media that can be opened (eg files, spooled or lazy media) is streamed rather than read into memory
+    opener = getattr(m, "_open", None)
+    if opener is None:
+        data = m.get_bytes()
+        for i in range(0, len(data), MEDIA_CHUNK_SIZE):
+            yield data[i:(i+MEDIA_CHUNK_SIZE)]
+        return
+    with opener() as f:
+        for chunk in iter(lambda: f.read(MEDIA_CHUNK_SIZE), b""):
+            yield chunk
+
+
 def serialise(reqresp, do_send, collect_capabilities=None, remote_is_trusted=False):
     media = []
 
@@ -154,18 +225,18 @@ def serialise(reqresp, do_send, collect_capabilities=None, remote_is_trusted=Fal
     do_send(reqresp)
 
     for (id,m) in media:
-        data = m.get_bytes()
-        l = len(data)
-        i = 0
+        chunks = _media_chunks(m)
+        # Read one chunk ahead, so we know which is the last. Empty media is sent as one empty chunk.
+        chunk = next(chunks, b"")
         n = 0
-        sent_once = False
-        while i < l or not sent_once:
-            chunk_len = min(l - i, 65536)
+        while True:
+            next_chunk = next(chunks, None)
 
             do_send({'type': 'CHUNK_HEADER', 'requestId': reqresp['id'], 'mediaId': id,
-                     'chunkIndex': n, 'lastChunk': (i + chunk_len == l)},
-                    data[i:(i+chunk_len)])
+                     'chunkIndex': n, 'lastChunk': next_chunk is None},
+                    chunk)
 
-            i += chunk_len
+            if next_chunk is None:
+                break
+            chunk = next_chunk
             n += 1
-            sent_once = True
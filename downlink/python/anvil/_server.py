@@ -77,6 +77,33 @@ class LiveObjectProxy(anvil.LiveObject):
         except AnvilWrappedError as e:
             raise _deserialise_exception(e.error_obj)
 
+    def prefetch(self, keys):
+        """Fetch several items in one call, so that looking them up afterwards is served from the item cache.
+        Backends opt in by implementing __anvil_get_items__(keys) -> {key: value}."""
+        missing = [k for k in keys if k not in self._spec.get("itemCache", {})]
+        if not missing:
+            return
+        if "__anvil_get_items__" in self._spec["methods"]:
+            try:
+                values = _do_call([missing], {}, fn_name="__anvil_get_items__", live_object=self)
+            except AnvilWrappedError as e:
+                raise _deserialise_exception(e.error_obj)
+        else:
+            values = dict((k, self[k]) for k in missing)
+        # Merge, rather than sending a cacheUpdate from the backend: cacheUpdates replace the whole item cache
+        # (here and in the browser), and the call only carries the keys we asked for.
+        self._spec.setdefault("itemCache", {}).update(values)
+
+    def fetch_all(self):
+        """Fetch every item the backend will give us in one call"""
+        if "__anvil_get_items__" not in self._spec["methods"]:
+            raise Exception("fetch_all() is not supported by <LiveObject: %s>" % self._spec.get("backend", "INVALID"))
+        try:
+            values = _do_call([None], {}, fn_name="__anvil_get_items__", live_object=self)
+        except AnvilWrappedError as e:
+            raise _deserialise_exception(e.error_obj)
+        self._spec.setdefault("itemCache", {}).update(values)
+
     def __setitem__(self, key, value):
         if key in self._spec.get("itemCache", {}):
             del self._spec["itemCache"][key]
@@ -170,6 +197,39 @@ def invalidate_client_objects():
     _run_invalidated_client_objects_callbacks()
 
 
+# Callbacks that run when a server function (or background task) has finished running,
+# but before its response is sent. Used by services that defer work until the end of a call.
+_call_complete_callbacks = []
+
+def _on_call_complete(f):
+    _call_complete_callbacks.append(f)
+
+def _run_call_complete_callbacks():
+    # Every callback runs (they each reset per-call state), then the first error is raised
+    error = None
+    for f in _call_complete_callbacks:
+        try:
+            f()
+        except Exception as e:
+            if error is None:
+                error = e
+    if error is not None:
+        raise error
+
+
+# Callbacks that run before each outbound server call is sent, with the name of the function (or live object
+# method) being called. Used by services (eg tables transactions) that must set up server-side state, or send
+# work they have deferred, before user code calls other server functions.
+_outbound_call_callbacks = []
+
+def _on_outbound_call(f):
+    _outbound_call_callbacks.append(f)
+
+def _run_outbound_call_callbacks(fn_name):
+    for f in _outbound_call_callbacks:
+        f(fn_name)
+
+
 # Wildcard for unwrap_capability
 class _CapAny(object):
     def __repr__(self):
@@ -535,6 +595,16 @@ class LazyMedia(anvil.Media):
         except AnvilWrappedError as e:
             raise _deserialise_exception(e.error_obj)
 
+    def _open(self):
+        try:
+            fetched = self._fetch()
+            if hasattr(fetched, "_open"):
+                return fetched._open()
+            import io
+            return io.BytesIO(fetched.get_bytes())
+        except AnvilWrappedError as e:
+            raise _deserialise_exception(e.error_obj)
+
 
 class AnvilWrappedError(Exception):
     registered_type_name = None
@@ -142,6 +142,16 @@ call_responses = {}
 waiting_for_calls = threading.Condition() if MULTITHREADED else None
 
 
+def capture_call_info():
+    """Returns a function that makes another thread's outbound calls belong to the current call"""
+    call_id, stack_id, session = call_info.call_id, call_info.stack_id, call_info.session
+
+    def restore():
+        call_info.call_id, call_info.stack_id, call_info.session = call_id, stack_id, session
+
+    return restore
+
+
 # If MULTITHREADED is False, better overwrite this
 def poll_for_call_responses(*args):
     raise AssertionError("We're in single-threaded mode, but poll_for_call_responses() is not set")
@@ -287,6 +297,8 @@ class IncomingRequest(_serialise.IncomingReqResp):
                                 raise _server.NoServerFunctionError({'type': 'anvil.server.NoServerFunctionError',
                                                                      'message': 'No server function matching "%s" has been registered' % command})
 
+                    _server._run_call_complete_callbacks()
+
                     def err(*args):
                         raise Exception("Cannot save DataMedia objects in anvil.server.session")
 
@@ -328,6 +340,12 @@ class IncomingRequest(_serialise.IncomingReqResp):
 
                     e = _server._report_exception(self.json["id"])
 
+                    try:
+                        # Deferred work still runs, but must not mask the original exception
+                        _server._run_call_complete_callbacks()
+                    except Exception as cc_err:
+                        print("Error while completing a failed call: %s" % repr(cc_err))
+
                     if self.dump_task_state:
                         def err(*args):
                             raise Exception("Cannot save DataMedia objects in anvil.server.session")
@@ -413,6 +431,8 @@ live_object_backend = register_live_object_backend
 
 
 def do_call(args, kwargs, fn_name=None, live_object=None): # Yes, I do mean args and kwargs without *s
+    _server._run_outbound_call_callbacks(fn_name)
+
     id = gen_id()
 
     call_responses[id] = None
@@ -1,12 +1,15 @@
 # This package implements the server side of ext_data. Use it to implement schemas.
+import contextlib
 import json
 import threading
+import time
+from collections import OrderedDict
 from pprint import pprint
 
 from dataclasses import dataclass
 
 import dataclasses
-from typing import Any, Callable, List, Tuple, Union, Dict, Iterable, Optional, Set
+from typing import Any, Callable, ContextManager, List, Tuple, Union, Dict, Iterable, Optional, Set
 import anvil.server
 from anvil.server import Capability, unwrap_capability
 
@@ -47,6 +50,8 @@ class CollectionDef:
     delete_record: Optional[Callable[[RecordId], None]] = None
     client_fields: Optional[List[str]] = None # which fields to expose to the client?
     summary_fields: Optional[List[str]] = None # which fields to show by default in the object's repr?
+    cache_ttl: Optional[float] = None # cache loaded records for this many seconds (None = don't cache)
+    cache_size: int = 1000 # how many records to cache, if cache_ttl is set
     _fields_by_name: Dict[str,FieldDef] = None
 
     @property
@@ -92,6 +97,49 @@ class _FetchConfig:
     collection_info: Dict[str,CollectionInfo] = dataclasses.field(default_factory=dict)
 
 
+class _RecordCache:
+    # An LRU identity map of loaded record data for one collection (see CollectionDef.cache_ttl).
+    # Each record is cached separately for each kind of fetch context, since they may load different fields.
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[Any, Tuple[float, Any]]]" = OrderedDict()
+
+    def get(self, str_id: str, ctx_key: Any):
+        with self._lock:
+            by_ctx = self._entries.get(str_id)
+            entry = by_ctx.get(ctx_key) if by_ctx else None
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires < time.monotonic():
+                del by_ctx[ctx_key]
+                return None
+            self._entries.move_to_end(str_id)
+            return data
+
+    def put(self, str_id: str, ctx_key: Any, data: Any):
+        with self._lock:
+            self._entries.setdefault(str_id, {})[ctx_key] = (time.monotonic() + self.ttl, data)
+            self._entries.move_to_end(str_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, str_ids: Iterable[str]):
+        with self._lock:
+            for str_id in str_ids:
+                self._entries.pop(str_id, None)
+
+
+def _cacheable(data: Any):
+    # Records returned by a loader are ingested when they're created, so we can't replay them from a cache
+    if type(data) is not dict:
+        return False
+    return not any(isinstance(v, Record) or (type(v) is list and any(isinstance(e, Record) for e in v))
+                   for v in data.values())
+
+
 class _RecordCatcher(threading.local):
     def __init__(self):
         self.records: List[Record] = []
@@ -319,6 +367,12 @@ class FetchContext:
 
         return permit_by_default, rdict
 
+    def _batch_key(self) -> str:
+        # Contexts with the same key fetch the same data, however we reached them
+        return tightjson([self._current_collection.name if self._current_collection else None,
+                          self._restriction, self._request, self._valid,
+                          self._client_visible, self._client_visible_explicit])
+
     def _get_collection_info(self) -> CollectionInfo:
         if not self._current_collection:
             raise ValueError("This FetchContext does not represent a collection")
@@ -487,11 +541,36 @@ def _caller_is_trusted():
     return remote_caller is None or remote_caller.is_trusted
 
 class SchemaImpl(CallImpl):
-    def __init__(self, name: str, collections: List[CollectionDef]):
+    def __init__(self, name: str, collections: List[CollectionDef],
+                 unit_of_work: Optional[Callable[[], ContextManager]] = None,
+                 load_collection: Optional[Callable[[str], None]] = None,
+                 run_concurrently: Optional[Callable[[List[Callable[[], Any]]], List[Any]]] = None):
         super().__init__(name)
         self.name = name
+        # Each server call (load, update, delete) runs inside one unit of work, so a backend can share a
+        # connection/transaction across every load_records() and follow_links() call it makes
+        self.unit_of_work = unit_of_work or contextlib.nullcontext
+        # Called with the name of a collection we don't know (yet), for backends that discover them lazily.
+        # It should call set_collections() if it finds it.
+        self.load_collection = load_collection
+        # Given a list of functions, call them all (perhaps in parallel) and return their results in order.
+        # Used for independent loads and follows at the same depth.
+        self.run_concurrently = run_concurrently
+        self.set_collections(collections)
+
+        # Register this schema's server endpoints
+        anvil.server.callable(self.prefix+"/load")(lambda *args, **kwargs: self.load_record_data(*args, **kwargs))
+        anvil.server.callable(self.prefix+"/update")(lambda *args, **kwargs: self.update_records(*args, **kwargs))
+        anvil.server.callable(self.prefix+"/delete")(lambda *args, **kwargs: self.delete_records(*args, **kwargs))
+
+    def set_collections(self, collections: List[CollectionDef]):
         self.collections = {c.name: c for c in collections}
-        self.default_specs = {c.name: _CollectionSpec(s=name, c=c.name) for c in collections}
+        old_caches = getattr(self, "record_caches", {})
+        self.record_caches: Dict[str,_RecordCache] = {
+            c.name: old_caches.get(c.name) or _RecordCache(c.cache_ttl, c.cache_size)
+            for c in collections if c.cache_ttl
+        }
+        self.default_specs = {c.name: _CollectionSpec(s=self.name, c=c.name) for c in collections}
 
         def mk_default_fetch_contexts(for_client: bool):
             cfg = _FetchConfig(schema=self, for_client=for_client, default_client_cols_only=for_client)
@@ -502,10 +581,10 @@ class SchemaImpl(CallImpl):
         self.default_server_fetch_ctx = mk_default_fetch_contexts(False)
         self.default_client_fetch_ctx = mk_default_fetch_contexts(True)
 
-        # Register this schema's server endpoints
-        anvil.server.callable(self.prefix+"/load")(lambda *args, **kwargs: self.load_record_data(*args, **kwargs))
-        anvil.server.callable(self.prefix+"/update")(lambda *args, **kwargs: self.update_records(*args, **kwargs))
-        anvil.server.callable(self.prefix+"/delete")(lambda *args, **kwargs: self.delete_records(*args, **kwargs))
+    def _get_collection(self, collection_name: str) -> CollectionDef:
+        if collection_name not in self.collections and self.load_collection:
+            self.load_collection(collection_name)
+        return self.collections[collection_name]
 
     def follow_link(self, collection: Optional[CollectionDef], field_name: str):
         field = collection.fields_by_name.get(field_name) if collection else None
@@ -516,7 +595,7 @@ class SchemaImpl(CallImpl):
         if collection_spec.s != self.name:
             raise ValueError(f"load_record_data() for schema {self.name!r} called with a spec from schema {collection_spec.s!r}: {collection_key!r}")
 
-        collection = self.collections[collection_spec.c]
+        collection = self._get_collection(collection_spec.c)
         for_client = not _caller_is_trusted()
 
         if collection_spec.f or collection_spec.cf or request:
@@ -554,7 +633,7 @@ class SchemaImpl(CallImpl):
 
             collection, fetch_context = self._collection_and_context_for_call(collection_key, request)
 
-            with _catch_records as cr:
+            with self.unit_of_work(), _catch_records as cr:
                 self.load_and_fill_out(cdata, gsdata, collection, record_ids, fetch_context)
                 for record in cr.records:
                     record._add_to_cdata(cdata, gsdata, sldata, True, not fetch_context.for_client)
@@ -567,19 +646,136 @@ class SchemaImpl(CallImpl):
         record_ids: List[RecordId] = dataclasses.field(default_factory=list)
         unfollowed: List[Tuple[RecordId,Any]] = dataclasses.field(default_factory=list)
 
+    class _FillOutPlan:
+        # Links are followed breadth-first. At each level we gather every outstanding record ID for each
+        # (equivalent) fetch context, drop the ones we've already loaded, and load the rest in one batch.
+        # The loads and follow_link[s] calls for a level are independent, so they can run concurrently.
+        def __init__(self, schema: "SchemaImpl", cdata: CompactData, gsdata: GlobalSharedData):
+            self.schema = schema
+            self.cdata = cdata
+            self.gsdata = gsdata
+            self.queries = 0
+            self.cache_hits = 0
+            # Keyed by FetchContext._batch_key(), because the same collection reached by different paths
+            # may be fetched with different fields. We can only skip a record if we've loaded it the same way.
+            self._seen: Set[Tuple[str,str]] = set()
+            self._to_load: Dict[str, Tuple[FetchContext, Dict[str,RecordId]]] = {}
+            self._loaded: Dict[str, Tuple[FetchContext, List[Tuple[RecordId,RecordDataValue]]]] = {}
+            self._jobs: List[Tuple[Callable[[], Any], Callable[[Any], None]]] = []
+
+        def add_ids(self, ctx: FetchContext, record_ids: Iterable[RecordId]):
+            key = ctx._batch_key()
+            _, pending = self._to_load.setdefault(key, (ctx, {}))
+            for record_id in record_ids:
+                str_id = tightjson(record_id)
+                if (key, str_id) not in self._seen:
+                    pending.setdefault(str_id, record_id)
+
+        def add_loaded(self, ctx: FetchContext, loaded_data: Iterable[Tuple[RecordId,RecordDataValue]],
+                       from_cache: bool = False):
+            key = ctx._batch_key()
+            _, loaded = self._loaded.setdefault(key, (ctx, []))
+            cache = None if from_cache else self._get_cache(ctx)
+            for record_id, data in loaded_data:
+                str_id = tightjson(record_id)
+                seen_key = (key, str_id)
+                if seen_key not in self._seen:
+                    self._seen.add(seen_key)
+                    loaded.append((record_id, data))
+                    if cache and _cacheable(data):
+                        cache.put(str_id, self._cache_key(ctx), data)
+
+        def _get_cache(self, ctx: FetchContext) -> Optional[_RecordCache]:
+            collection = ctx._current_collection
+            return self.schema.record_caches.get(collection.name) if collection else None
+
+        @staticmethod
+        def _cache_key(ctx: FetchContext):
+            return ctx._batch_key(), ctx._config.for_client, ctx._config.default_client_cols_only
+
+        def _load_from_cache(self, ctx: FetchContext, record_ids: List[RecordId]) -> List[RecordId]:
+            # Returns the IDs we still need to load
+            cache = self._get_cache(ctx)
+            if not cache:
+                return record_ids
+            cache_key = self._cache_key(ctx)
+            hits, misses = [], []
+            for record_id in record_ids:
+                data = cache.get(tightjson(record_id), cache_key)
+                if data is None:
+                    misses.append(record_id)
+                else:
+                    hits.append((record_id, data))
+            self.cache_hits += len(hits)
+            self.add_loaded(ctx, hits, from_cache=True)
+            return misses
+
+        def add_job(self, fetch: Callable[[], Any], ingest: Callable[[Any], None]):
+            # A call to the backend that can run at the same time as the other calls for this level
+            self._jobs.append((fetch, ingest))
+
+        def run(self):
+            while self._to_load or self._loaded or self._jobs:
+                to_load, self._to_load = self._to_load, {}
+                for key, (ctx, pending) in to_load.items():
+                    record_ids = [rid for str_id, rid in pending.items() if (key, str_id) not in self._seen]
+                    record_ids = self._load_from_cache(ctx, record_ids)
+                    if record_ids:
+                        self._add_load_job(ctx, record_ids)
+
+                jobs, self._jobs = self._jobs, []
+                if len(jobs) > 1 and self.schema.run_concurrently:
+                    results = self.schema.run_concurrently([fetch for fetch, _ in jobs])
+                else:
+                    results = [fetch() for fetch, _ in jobs]
+                for (_, ingest), result in zip(jobs, results):
+                    ingest(result)
+
+                # Ingesting this level queues up the next one
+                loaded, self._loaded = self._loaded, {}
+                for ctx, loaded_data in loaded.values():
+                    if loaded_data:
+                        self.schema._ingest_and_follow(self, loaded_data, ctx)
+
+            return self.queries
+
+        def _add_load_job(self, ctx: FetchContext, record_ids: List[RecordId]):
+            collection = ctx._current_collection
+            assert collection
+            if collection.load_records:
+                self.queries += 1
+                fetch = lambda: collection.load_records(record_ids, ctx)
+            else:
+                self.queries += len(record_ids)
+                fetch = lambda: [collection.load_record(rid, ctx) for rid in record_ids]
+
+            def ingest(fetch_results):
+                if len(fetch_results) != len(record_ids):
+                    raise ValueError(f"load_records() returned {len(fetch_results)} item(s) instead of {len(record_ids)} at {ctx}")
+                self.add_loaded(ctx, zip(record_ids, fetch_results))
+
+            self.add_job(fetch, ingest)
+
+
     def load_and_fill_out(self, cdata: CompactData, gsdata: GlobalSharedData, collection: CollectionDef, record_ids: List[RecordId], ctx: FetchContext):
-        fetch_results = collection.load_records(record_ids, ctx) if collection.load_records \
-            else [collection.load_record(rid, ctx) for rid in record_ids]
-        if len(fetch_results) != len(record_ids):
-            raise ValueError(f"load_records() returned {len(fetch_results)} item(s) instead of {len(record_ids)} at {ctx}")
-        self.walk_and_fill_out(cdata, gsdata, zip(record_ids, fetch_results), ctx)
+        """Load records and everything they link to. Returns the number of backend queries made."""
+        plan = self._FillOutPlan(self, cdata, gsdata)
+        plan.add_ids(ctx, record_ids)
+        return plan.run()
 
     def walk_and_fill_out(self, cdata: CompactData, gsdata: GlobalSharedData, loaded_data: Iterable[Tuple[RecordId,RecordDataValue]], ctx: FetchContext):
+        """Ingest loaded records and follow their links. Returns the number of backend queries made."""
+        plan = self._FillOutPlan(self, cdata, gsdata)
+        plan.add_loaded(ctx, loaded_data)
+        return plan.run()
+
+    def _ingest_and_follow(self, plan: "SchemaImpl._FillOutPlan", loaded_data: List[Tuple[RecordId,RecordDataValue]], ctx: FetchContext):
         # We've got a list of dictionary data. Ingest data into the tx_data in a format that can be decoded by the
         # Record deserialiser
+        cdata = plan.cdata
 
         collection_info = ctx._get_collection_info()
-        gsdata["spec"].setdefault(collection_info.key, collection_info.data)
+        plan.gsdata["spec"].setdefault(collection_info.key, collection_info.data)
 
         # We now want to follow links. Links values can be specified by any of:
         #  - Returning a record ID in a link_single column
@@ -627,7 +823,6 @@ class SchemaImpl(CallImpl):
         # Now we actually ingest the results
         id_prefix = collection_info.key+"."
 
-        loaded_data = list(loaded_data) # TODO test remove
         for record_id, orig_data in loaded_data:
             data = ctx.trim_data(orig_data)
             if data is orig_data:
@@ -658,66 +853,80 @@ class SchemaImpl(CallImpl):
                 followed_ctx = ctx[field.name]
 
                 if ltf.record_ids:
-                    followed_collection = followed_ctx._current_collection
-                    assert followed_collection
-                    self.load_and_fill_out(cdata, gsdata, followed_collection, ltf.record_ids, followed_ctx)
+                    plan.add_ids(followed_ctx, ltf.record_ids)
 
                 if ltf.unfollowed:
-                    if field.type == "link_single":
-                        if field.follow_links_single:
-                            follow_data_single = field.follow_links_single([u for _, u in ltf.unfollowed], followed_ctx)
-                        elif field.follow_link_single:
-                            follow_data_single = [field.follow_link_single(u, followed_ctx) for _, u in ltf.unfollowed]
-                        else:
-                            raise TypeError(f"Field {collection.name}[{field.name!r}] returned UnfollowedLink objects but does not implement follow_link[s]_single")
-
-                        if len(follow_data_single) != len(ltf.unfollowed):
-                            raise ValueError(f"follow_links_single() for {collection.name}[{field.name!r}] returned {len(follow_data_single)} item(s) instead of {len(ltf.unfollowed)} at {followed_ctx}")
-
-                        # For single-link follows, the only valid answer is a list of Records or (id, record_data) tuples
-                        # TODO perhaps we shouldn't even allow the Records; I'm only keeping them for symmetry with multi links
-                        to_walk: List[Tuple[RecordId,RecordDataValue]] = []
-                        for followed_value, (record_id, _) in zip(follow_data_single, ltf.unfollowed):
-                            if isinstance(followed_value, Record):
-                                v = followed_value.id
-                            elif type(followed_value) is tuple and len(followed_value) == 2:
-                                v = followed_value[0]
-                                to_walk.append(followed_value)
-                            else:
-                                raise ValueError(f"follow_links_single() for {collection.name}[{field.name!r}] returned invalid item {followed_value!r}")
-                            cdata[id_prefix+tightjson(record_id)][field.name] = v
-                        self.walk_and_fill_out(cdata, gsdata, to_walk, followed_ctx)
-
+                    self._add_follow_job(plan, collection, field, ltf, followed_ctx, id_prefix)
+
+    def _add_follow_job(self, plan: "SchemaImpl._FillOutPlan", collection: CollectionDef, field: FieldDef,
+                        ltf: "SchemaImpl.LinkToFollow", followed_ctx: FetchContext, id_prefix: str):
+        cdata = plan.cdata
+        unfollowed = [u for _, u in ltf.unfollowed]
+
+        if field.type == "link_single":
+            if field.follow_links_single:
+                plan.queries += 1
+                fetch = lambda: field.follow_links_single(unfollowed, followed_ctx)
+            elif field.follow_link_single:
+                plan.queries += len(unfollowed)
+                fetch = lambda: [field.follow_link_single(u, followed_ctx) for u in unfollowed]
+            else:
+                raise TypeError(f"Field {collection.name}[{field.name!r}] returned UnfollowedLink objects but does not implement follow_link[s]_single")
+
+            def ingest(follow_data_single):
+                if len(follow_data_single) != len(ltf.unfollowed):
+                    raise ValueError(f"follow_links_single() for {collection.name}[{field.name!r}] returned {len(follow_data_single)} item(s) instead of {len(ltf.unfollowed)} at {followed_ctx}")
+
+                # For single-link follows, the only valid answer is a list of Records or (id, record_data) tuples
+                # TODO perhaps we shouldn't even allow the Records; I'm only keeping them for symmetry with multi links
+                to_walk: List[Tuple[RecordId,RecordDataValue]] = []
+                for followed_value, (record_id, _) in zip(follow_data_single, ltf.unfollowed):
+                    if isinstance(followed_value, Record):
+                        v = followed_value.id
+                    elif type(followed_value) is tuple and len(followed_value) == 2:
+                        v = followed_value[0]
+                        to_walk.append(followed_value)
                     else:
-                        if field.follow_links_multiple:
-                            follow_data_multiple = field.follow_links_multiple([u for _, u in ltf.unfollowed], followed_ctx)
-                        elif field.follow_link_multiple:
-                            follow_data_multiple = [field.follow_link_multiple(u, followed_ctx) for _, u in ltf.unfollowed]
-                        else:
-                            raise TypeError(f"Field {collection.name}[{field.name!r}] returned UnfollowedLink objects but does not implement follow_links_multiple")
-
-                        if len(follow_data_multiple) != len(ltf.unfollowed):
-                            raise ValueError(f"follow_links_multiple() for {collection.name}[{field.name!r}] returned {len(follow_data_multiple)} item(s) instead of {len(ltf.unfollowed)} at {followed_ctx}")
-
-                        # For link-multi follows, elements of the follow data may either be lists of record data
-                        # (to be walked), or anything other iterable object such as lazy iterables (to be returned
-                        # as-is)
-                        to_walk: List[Tuple[RecordId,RecordDataValue]] = []
-                        for followed_value, (record_id, _) in zip(follow_data_multiple, ltf.unfollowed):
-                            if type(followed_value) == list:
-                                v = []
-                                for elt in followed_value:
-                                    if isinstance(elt, Record):
-                                        v.append(elt.id) # assume already ingested
-                                    elif type(elt) is tuple and len(elt) == 2:
-                                        to_walk.append(elt)
-                                        v.append(elt[0])
-                                    else:
-                                        raise ValueError("follow_links() for {collection.name}[{field.name!r}] returned invalid item {followed_value!r}")
+                        raise ValueError(f"follow_links_single() for {collection.name}[{field.name!r}] returned invalid item {followed_value!r}")
+                    cdata[id_prefix+tightjson(record_id)][field.name] = v
+                plan.add_loaded(followed_ctx, to_walk)
+
+        else:
+            if field.follow_links_multiple:
+                plan.queries += 1
+                fetch = lambda: field.follow_links_multiple(unfollowed, followed_ctx)
+            elif field.follow_link_multiple:
+                plan.queries += len(unfollowed)
+                fetch = lambda: [field.follow_link_multiple(u, followed_ctx) for u in unfollowed]
+            else:
+                raise TypeError(f"Field {collection.name}[{field.name!r}] returned UnfollowedLink objects but does not implement follow_links_multiple")
+
+            def ingest(follow_data_multiple):
+                if len(follow_data_multiple) != len(ltf.unfollowed):
+                    raise ValueError(f"follow_links_multiple() for {collection.name}[{field.name!r}] returned {len(follow_data_multiple)} item(s) instead of {len(ltf.unfollowed)} at {followed_ctx}")
+
+                # For link-multi follows, elements of the follow data may either be lists of record data
+                # (to be walked), or anything other iterable object such as lazy iterables (to be returned
+                # as-is)
+                to_walk: List[Tuple[RecordId,RecordDataValue]] = []
+                for followed_value, (record_id, _) in zip(follow_data_multiple, ltf.unfollowed):
+                    if type(followed_value) == list:
+                        v = []
+                        for elt in followed_value:
+                            if isinstance(elt, Record):
+                                v.append(elt.id) # assume already ingested
+                            elif type(elt) is tuple and len(elt) == 2:
+                                to_walk.append(elt)
+                                v.append(elt[0])
                             else:
-                                v = followed_value
-                            cdata[id_prefix + tightjson(record_id)][field.name] = v
-                        self.walk_and_fill_out(cdata, gsdata, to_walk, followed_ctx)
+                                raise ValueError("follow_links() for {collection.name}[{field.name!r}] returned invalid item {followed_value!r}")
+                    else:
+                        v = followed_value
+                    cdata[id_prefix + tightjson(record_id)][field.name] = v
+                plan.add_loaded(followed_ctx, to_walk)
+
+        plan.add_job(fetch, ingest)
+
 
     def update_records(self, collection_key: str, updates: List[Tuple[Capability, dict]]):
         if not _caller_is_trusted():
@@ -748,12 +957,17 @@ class SchemaImpl(CallImpl):
                     raise Exception(f"Field {k!r} is not available for update")
 
         # Now we can do the update
-        if collection.update_records:
-            updated_values = collection.update_records(updates_with_id)
-        elif collection.update_record:
-            updated_values = [collection.update_record(rid, update) for rid, update in updates_with_id]
-        else:
-            raise TypeError(f"Collection {collection.name!r} does not implement update_record[s]()")
+        try:
+            with self.unit_of_work():
+                if collection.update_records:
+                    updated_values = collection.update_records(updates_with_id)
+                elif collection.update_record:
+                    updated_values = [collection.update_record(rid, update) for rid, update in updates_with_id]
+                else:
+                    raise TypeError(f"Collection {collection.name!r} does not implement update_record[s]()")
+        finally:
+            # Even if it failed, some of them may have been updated
+            self._invalidate_cached(collection, [rid for rid, _ in updates_with_id])
 
         if len(updated_values) != len(updates_with_id):
             raise ValueError(f"update_records() for {collection.name} returned {len(updated_values)} item(s) instead of {len(updates_with_id)}")
@@ -780,17 +994,36 @@ class SchemaImpl(CallImpl):
         if not collection.delete_records and not collection.delete_record:
             raise Exception(f"{collection.name!r} is not available for deletion")
 
-        if collection.delete_records:
-            collection.delete_records(ids_to_delete)
-        elif collection.delete_record:
-            for rid in ids_to_delete:
-                collection.delete_record(rid)
-        else:
-            raise TypeError(f"Collection {collection.name!r} does not implement delete_record[s]()")
+        try:
+            with self.unit_of_work():
+                if collection.delete_records:
+                    collection.delete_records(ids_to_delete)
+                elif collection.delete_record:
+                    for rid in ids_to_delete:
+                        collection.delete_record(rid)
+                else:
+                    raise TypeError(f"Collection {collection.name!r} does not implement delete_record[s]()")
+        finally:
+            self._invalidate_cached(collection, ids_to_delete)
 
         for cap in to_delete:
             cap.send_update(False)
 
+    def _invalidate_cached(self, collection: CollectionDef, record_ids: Iterable[RecordId]):
+        cache = self.record_caches.get(collection.name)
+        if cache:
+            cache.invalidate(tightjson(rid) for rid in record_ids)
+
+    def invalidate_cached_records(self, collection_name: str, record_ids: Optional[Iterable[RecordId]] = None):
+        """Drop cached records (or the whole collection's cache) after changing them other than through this schema"""
+        cache = self.record_caches.get(collection_name)
+        if cache is None:
+            return
+        if record_ids is None:
+            self.record_caches[collection_name] = _RecordCache(cache.ttl, cache.max_size)
+        else:
+            cache.invalidate(tightjson(rid) for rid in record_ids)
+
     def make_record(self, collection_name: str, id: RecordId, data: dict) -> Record:
         ctxs = self.default_server_fetch_ctx if _caller_is_trusted() else self.default_client_fetch_ctx
         return ctxs[collection_name].make_record(id, data)
@@ -806,7 +1039,7 @@ class SchemaImpl(CallImpl):
         client_visible_explicit = client_visible is not None
         if request is not None or client_visible_explicit:
             # Nonstandard context
-            collection = self.collections[collection_name]
+            collection = self._get_collection(collection_name)
             return FetchContext(
                 config=_FetchConfig(self, for_client, for_client and not client_visible_explicit),
                 client_visible=client_visible if client_visible_explicit else True,
@@ -816,6 +1049,7 @@ class SchemaImpl(CallImpl):
                 collection=collection
             )
         else:
+            self._get_collection(collection_name)
             default_contexts = self.default_client_fetch_ctx if for_client else self.default_server_fetch_ctx
             return default_contexts[collection_name]
 
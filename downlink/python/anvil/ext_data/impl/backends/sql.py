@@ -1,18 +1,37 @@
 from pprint import pprint
 
+import asyncio
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from functools import partial
 
-from sqlalchemy.engine import CursorResult, Row
+from sqlalchemy.engine import Connection, CursorResult, Row
 from sqlalchemy.sql import Selectable, quoted_name
-from typing import Tuple, Dict, Optional, List, Iterable, cast, Any, _SpecialForm
+from typing import Tuple, Dict, Optional, List, Iterable, Callable, Union, cast, Any, _SpecialForm
 from sqlalchemy import MetaData, Engine, select, insert, update, delete, Table, Column, ForeignKey, \
-    ForeignKeyConstraint, values, column, join, and_, bindparam
+    ForeignKeyConstraint, values, column, join, and_, bindparam, tuple_, inspect
 from datetime import date, datetime
 import anvil.server
 from .. import SchemaImpl, CollectionDef, RecordId, FetchContext, FieldDef, UnfollowedLink, RecordDataValue
+from ..lazy_iter import iter_page, make_iterable
 from ... import Record
 
+# How many paged searches each SQLTables remembers, so that their later pages can be fetched
+MAX_PAGED_QUERIES = 1000
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncEngine, AsyncConnection
+except ImportError:
+    # Needs greenlet
+    AsyncEngine = AsyncConnection = None
+
 try:
     # For Python 3.7 - wrap Literal in ''
 
@@ -25,8 +44,18 @@ except ImportError:
 class SQLTables:
     # The entry point to this API. Initialise with an SQLAlchemy Engine object, then it behaves
     # a little like anvil.tables.app_tables.
-    def __init__(self, schema_name: str, engine: Engine, metadata: Optional[MetaData] = None):
-        impl = _DBTablesImpl(schema_name, engine, metadata)
+    #
+    # Reflecting a big database is slow. Pass reflection_cache (a file path) to keep the reflected MetaData
+    # between processes. It's reused while the database's fingerprint matches; by default that's its list of
+    # tables, so pass a fingerprint function (Connection -> any picklable value) if you alter columns in place.
+    # Pass lazy=True to reflect each table (and the tables it links to) the first time it's used.
+    #
+    # The engine may be an AsyncEngine. The API stays synchronous, but independent loads (eg sibling links at the
+    # same depth) run concurrently, up to max_concurrency at a time.
+    def __init__(self, schema_name: str, engine: "Union[Engine, AsyncEngine]", metadata: Optional[MetaData] = None,
+                 reflection_cache: Optional[str] = None, fingerprint: Optional[Callable[[Connection], Any]] = None,
+                 lazy: bool = False, max_concurrency: int = 4):
+        impl = _DBTablesImpl(schema_name, engine, metadata, reflection_cache, fingerprint, lazy, max_concurrency)
         object.__setattr__(self, "impl", impl)
 
     def __getattribute__(self, name):
@@ -47,33 +76,252 @@ class SQLTable:
     def meta_table(self):
         return self._impl.table
 
-    def search(self, query: Selectable):
-        """Search with a raw query"""
+    def search(self, query: Selectable, project: bool = False):
+        """Search with a raw query. If project is set, only fetch the columns the fetch context needs"""
         ctx = self._impl.dbti.schema.get_fetch_context(self._impl.table.name)
-        with ctx.record_builder() as rb:
-            rb.add_records(self._impl.load_records_from_query(query, ctx))
+        with self._impl.dbti.unit_of_work(), ctx.record_builder() as rb:
+            rb.add_records(self._impl.load_records_from_query(query, ctx, project))
             return rb.get_record_list()
 
+    def search_pages(self, query: Selectable, page_size: int = 100):
+        """Search with a raw query, returning a LazyIterable that fetches page_size records at a time.
+        The query should not have its own LIMIT or OFFSET.
+
+        The query itself stays in this process (the most recent MAX_PAGED_QUERIES are kept), so later pages
+        can only be fetched from a process that keeps running, such as an uplink or a persistent server."""
+        return self._impl.dbti.search_pages(self._impl, query, page_size)
+
     def add_row(self, **values):
         """Insert a row with the collection's interpretation of fields"""
         ctx = self._impl.dbti.schema.get_fetch_context(self._impl.table.name)
-        return self._impl.add_rows([values], ctx)
+        with self._impl.dbti.unit_of_work(write=True):
+            return self._impl.add_rows([values], ctx)
+
+
+def unit_of_work(tables: SQLTables, write: bool = False):
+    """Share one connection (and one commit) between all the queries in a block"""
+    return object.__getattribute__(tables, "impl").unit_of_work(write)
+
+
+def get_metrics(tables: SQLTables) -> Dict[str, int]:
+    """How many connections have been checked out, committed and rolled back"""
+    return object.__getattribute__(tables, "impl").get_metrics()
+
+
+class _UnitOfWork(threading.local):
+    # The connection shared by everything within the outermost unit_of_work() on this thread
+    def __init__(self):
+        self.conn: Optional[Connection] = None
+        self.depth = 0
+        self.dirty = False
+
+
+class _AsyncRunner:
+    # An event loop on its own thread, so synchronous code can wait for the async engine
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name="ext_data-sql-async", daemon=True).start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+
+class _SyncConnection:
+    # Just enough of the Connection API for our queries, on top of an AsyncConnection
+    def __init__(self, runner: _AsyncRunner, conn: "AsyncConnection"):
+        self._runner = runner
+        self._conn = conn
+
+    def execute(self, statement, parameters=None):
+        # AsyncConnection.execute() returns a buffered result, which we can iterate synchronously
+        return self._runner.run(self._conn.execute(statement, parameters))
+
+    def run_sync(self, fn: Callable[[Connection], Any]):
+        return self._runner.run(self._conn.run_sync(fn))
+
+    def commit(self):
+        self._runner.run(self._conn.commit())
+
+    def rollback(self):
+        self._runner.run(self._conn.rollback())
+
+
+def _table_names_fingerprint(conn: Connection):
+    return sorted(inspect(conn).get_table_names())
 
 
 class _DBTablesImpl:
-    def __init__(self, schema_name: str, engine: Engine, metadata: Optional[MetaData]):
+    def __init__(self, schema_name: str, engine: "Union[Engine, AsyncEngine]", metadata: Optional[MetaData],
+                 reflection_cache: Optional[str] = None, fingerprint: Optional[Callable[[Connection], Any]] = None,
+                 lazy: bool = False, max_concurrency: int = 4):
         self.engine = engine
-        if metadata is None:
-            self.md = MetaData()
-            self.md.reflect(bind=engine)
-        else:
-            self.md = metadata
+        self._async_runner = None
+        self._pool = None
+        if AsyncEngine is not None and isinstance(engine, AsyncEngine):
+            self._async_runner = _AsyncRunner()
+            # Each worker thread blocks on its own connection while the event loop overlaps their queries
+            self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="ext_data-sql")
         self.table_facades: Dict[str, SQLTable] = {}
         self.tables: Dict[str, "_TableImpl"] = {}
         self.collections: Dict[str, CollectionDef] = {}
+        self._reflection_cache = reflection_cache
+        self._reflection_lock = threading.RLock()
+        self._lazy = metadata is None and lazy
+        self._cache_key = None
+
+        if metadata is not None:
+            self.md = metadata
+        else:
+            self.md = None
+            if reflection_cache:
+                self._cache_key = (engine.url.render_as_string(hide_password=True),
+                                   self._run_sync(fingerprint or _table_names_fingerprint))
+                self.md = self._read_reflection_cache()
+            if self.md is None:
+                self.md = MetaData()
+                if not self._lazy:
+                    self._run_sync(lambda conn: self.md.reflect(bind=conn))
+                    self._write_reflection_cache()
         self._setup_collections()
 
-        self.schema = SchemaImpl(schema_name, list(self.collections.values()))
+        self._uow = _UnitOfWork()
+        self._metrics_lock = threading.Lock()
+        self.metrics = {"checkouts": 0, "commits": 0, "rollbacks": 0}
+
+        self.schema = SchemaImpl(schema_name, list(self.collections.values()), unit_of_work=self.unit_of_work,
+                                 load_collection=self._reflect_table if self._lazy else None,
+                                 run_concurrently=self._run_concurrently if self._pool else None)
+
+        # Paged searches, least recently used first. The query stays here; its capability only names it.
+        self._paged_queries: "OrderedDict[str, Selectable]" = OrderedDict()
+        self._paged_queries_lock = threading.Lock()
+        self._iter_name = "sql:" + schema_name
+        iter_page(self._iter_name)(self._get_page)
+
+    def search_pages(self, table_impl: "_TableImpl", query: Selectable, page_size: int):
+        compiled = query.compile(dialect=self.engine.dialect)
+        query_key = hashlib.sha256(repr((str(compiled), sorted(compiled.params.items()))).encode()).hexdigest()
+        with self._paged_queries_lock:
+            self._paged_queries[query_key] = query
+            self._paged_queries.move_to_end(query_key)
+            while len(self._paged_queries) > MAX_PAGED_QUERIES:
+                self._paged_queries.popitem(last=False)
+
+        iter_spec = [table_impl.table.name, query_key, page_size]
+        first_page, next_cursor = self._get_page(iter_spec, None)
+        return make_iterable(self._iter_name, iter_spec, first_page, next_cursor)
+
+    def _get_page(self, iter_spec, cursor):
+        table_name, query_key, page_size = iter_spec
+        with self._paged_queries_lock:
+            query = self._paged_queries.get(query_key)
+            if query is not None:
+                self._paged_queries.move_to_end(query_key)
+        if query is None:
+            # Either it's been evicted, or this is a different process from the one that ran the search
+            raise ValueError("This search is no longer available. Please search again.")
+        # The default fetch context depends on the caller, so this serves trusted and client code alike
+        ctx = self.schema.get_fetch_context(table_name)
+        return self.tables[table_name].load_page(query, ctx, page_size, cursor)
+
+    def _read_reflection_cache(self) -> Optional[MetaData]:
+        try:
+            with open(self._reflection_cache, "rb") as f:
+                cache_key, md = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ignoring unreadable reflection cache {self._reflection_cache}: {e}")
+            return None
+        return md if cache_key == self._cache_key else None
+
+    def _write_reflection_cache(self):
+        if not self._reflection_cache:
+            return
+        # Write-then-rename, so a concurrent reader never sees half a file
+        cache_dir = os.path.dirname(os.path.abspath(self._reflection_cache))
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((self._cache_key, self.md), f)
+            os.replace(tmp_path, self._reflection_cache)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _reflect_table(self, name: str):
+        with self._reflection_lock:
+            if name in self.tables:
+                return
+            if not self._run_sync(lambda conn: inspect(conn).has_table(name)):
+                return
+            # This also reflects the tables it has foreign keys to
+            self._run_sync(lambda conn: self.md.reflect(bind=conn, only=[name]))
+            self._write_reflection_cache()
+            self._setup_collections()
+            self.schema.set_collections(list(self.collections.values()))
+
+    def _count(self, metric: str):
+        with self._metrics_lock:
+            self.metrics[metric] += 1
+
+    def get_metrics(self) -> Dict[str, int]:
+        with self._metrics_lock:
+            return dict(self.metrics)
+
+    @contextmanager
+    def _connect(self):
+        if self._async_runner is None:
+            with self.engine.connect() as conn:
+                yield conn
+        else:
+            conn = self._async_runner.run(self.engine.connect().start())
+            try:
+                yield _SyncConnection(self._async_runner, conn)
+            finally:
+                self._async_runner.run(conn.close())
+
+    def _run_sync(self, fn: Callable[[Connection], Any]):
+        # Run fn with a synchronous Connection, whichever kind of engine we have
+        with self._connect() as conn:
+            return fn(conn) if self._async_runner is None else conn.run_sync(fn)
+
+    def _run_concurrently(self, fns: List[Callable[[], Any]]):
+        # Each function runs outside our unit of work, on its own connection. That's fine for loading, unless
+        # we've written something the other connections can't see yet.
+        if self._uow.dirty:
+            return [fn() for fn in fns]
+        return list(self._pool.map(lambda fn: fn(), fns))
+
+    @contextmanager
+    def unit_of_work(self, write: bool = False):
+        # Nested units of work reuse the outer connection. Writes are committed once,
+        # when the outermost unit exits cleanly; anything else is rolled back.
+        uow = self._uow
+        if uow.conn is not None:
+            uow.depth += 1
+            uow.dirty = uow.dirty or write
+            try:
+                yield uow.conn
+            finally:
+                uow.depth -= 1
+            return
+
+        with self._connect() as conn:
+            self._count("checkouts")
+            uow.conn, uow.depth, uow.dirty = conn, 1, write
+            try:
+                yield conn
+                if uow.dirty:
+                    conn.commit()
+                    self._count("commits")
+            except BaseException:
+                if uow.dirty:
+                    conn.rollback()
+                    self._count("rollbacks")
+                raise
+            finally:
+                uow.conn, uow.depth, uow.dirty = None, 0, False
 
     @dataclass
     class Link:
@@ -88,6 +336,10 @@ class _DBTablesImpl:
             return field_type
 
     def _setup_collections(self):
+        # In lazy mode this is re-run as tables are reflected, because new tables can add backward links to
+        # existing ones. The SQLTable facades we've already handed out are kept, and pointed at the new impls.
+        tables: Dict[str, "_TableImpl"] = {}
+        collections: Dict[str, CollectionDef] = {}
         links_by_collection: Dict[str, Dict[str, _DBTablesImpl.Link]] = {}
 
         # First, collect a list of all FKs
@@ -124,11 +376,19 @@ class _DBTablesImpl:
                 fields[field.name] = field
 
             table_impl = _TableImpl(self, table, fields, links)
-            self.collections[table.name] = table_impl.collection
-            self.tables[table.name] = table_impl
-            self.table_facades[table.name] = SQLTable(table_impl)
+            collections[table.name] = table_impl.collection
+            tables[table.name] = table_impl
+
+        self.tables, self.collections = tables, collections
+        for name, table_impl in tables.items():
+            if name in self.table_facades:
+                self.table_facades[name]._impl = table_impl
+            else:
+                self.table_facades[name] = SQLTable(table_impl)
 
     def get_table(self, name: str):
+        if self._lazy and name not in self.table_facades and not name.startswith("__"):
+            self._reflect_table(name)
         return self.table_facades.get(name)
 
 
@@ -152,6 +412,16 @@ class _TableImpl:
         pk_cols = set(self.table.primary_key)
         return [col.name for col in self.table.columns if col in pk_cols or ctx[col.name]]
 
+    def _get_columns_to_select(self, ctx: FetchContext, extra_cols: Iterable[Column] = ()) -> List[Column]:
+        # The primary key, the fields we'll return, and the columns we need to follow links
+        wanted = set(self.table.primary_key)
+        wanted.update(extra_cols)
+        wanted.update(col for col in self.table.columns if ctx[col.name])
+        for link in self.links.values():
+            if ctx.walk(link.field_name, not link.link_multi):
+                wanted.update([fk.column for fk in link.fkc.elements] if link.backward else link.fkc.columns)
+        return [col for col in self.table.columns if col in wanted]
+
     def _values_from_row(self, r: Row, col_names_of_interest: List[str], ctx: FetchContext) -> Iterable[RecordDataValue]:
         # print("CNOI =", col_names_of_interest, "ctx =", ctx)
         # print("links =", self.links)
@@ -168,8 +438,8 @@ class _TableImpl:
         return rdata
 
     def _load_by_cols(self, lookup_cols: Iterable[Column], lookup_values: List[Tuple], ctx: FetchContext):
-        with self.dbti.engine.connect() as conn:
-            stmt = select(self.table) # TODO trim columns
+        with self.dbti.unit_of_work() as conn:
+            stmt = select(*self._get_columns_to_select(ctx, lookup_cols))
             if len(lookup_cols) == 1:
                 col = next(iter(lookup_cols))
                 stmt = stmt.filter(col.in_([i[0] for i in lookup_values]))
@@ -216,9 +486,13 @@ class _TableImpl:
 
         return output
 
-    def load_records_from_query(self, query: Selectable, ctx: FetchContext):
+    def load_records_from_query(self, query: Selectable, ctx: FetchContext, project: bool = False):
         col_names_of_interest = self._get_column_names_of_interest(ctx)
-        with self.dbti.engine.connect() as conn:
+        if project:
+            # Wrapping the query as a subquery may not preserve its ORDER BY on every database, so this is opt-in
+            subq = query.subquery()
+            query = select(*[subq.c[col.name] for col in self._get_columns_to_select(ctx) if col.name in subq.c])
+        with self.dbti.unit_of_work() as conn:
             result = conn.execute(query)
             # result = list(result)
             # print("Query result =", result)
@@ -229,6 +503,34 @@ class _TableImpl:
             # print("Query rvalues =", rvalues)
             return rvalues
 
+    def load_page(self, query: Selectable, ctx: FetchContext, page_size: int, cursor: Any):
+        # Unordered queries are paged by primary key (the cursor is the last key we sent), so each page is an
+        # index seek. Queries with their own ORDER BY fall back to OFFSET (the cursor is the row number).
+        pk_cols = list(self.table.primary_key)
+        keyset = not getattr(query, "_order_by_clauses", None)
+        if keyset:
+            query = query.order_by(*pk_cols)
+            if cursor:
+                query = query.where(tuple_(*pk_cols) > tuple_(*cursor))
+        elif cursor:
+            query = query.offset(cursor)
+
+        with self.dbti.unit_of_work(), ctx.record_builder() as rb:
+            # Fetch one extra row to find out whether there's another page
+            rvalues = self.load_records_from_query(query.limit(page_size + 1), ctx)
+            has_more = len(rvalues) > page_size
+            rvalues = rvalues[:page_size]
+            rb.add_records(rvalues)
+            page = rb.get_record_list()
+
+        if not has_more:
+            next_cursor = None
+        elif keyset:
+            next_cursor = list(rvalues[-1][0])
+        else:
+            next_cursor = (cursor or 0) + page_size
+        return page, next_cursor
+
     def follow_links_single(self, link: _DBTablesImpl.Link, link_values: List[Tuple], ctx: FetchContext):
         other_table = link.fkc.table.name if link.backward else link.fkc.referred_table.name
         return self.dbti.tables[other_table]._follow_links_single(link, link_values, ctx)
@@ -308,7 +610,7 @@ class _TableImpl:
 
             update_data.append(row)
 
-        with self.dbti.engine.connect() as conn:
+        with self.dbti.unit_of_work(write=True) as conn:
             r = conn.execute(
                 update(self.table).where(and_(*[pkc == bindparam("_anvil_pk_"+pkc.name) for pkc in self.table.primary_key])),
                 update_data
@@ -316,19 +618,15 @@ class _TableImpl:
             if r.rowcount != len(update_data):
                 raise ValueError("Record(s) deleted and could not updated")
 
-            conn.commit()
-
         return [u for _, u in updates]
 
     def delete_record(self, id: RecordId):
-        with self.dbti.engine.connect() as conn:
+        with self.dbti.unit_of_work(write=True) as conn:
             conn.execute(delete(self.table).where(
                 *(pkcol == value for pkcol, value in zip(self.table.primary_key, id)))
             )
-            conn.commit()
 
     def add_rows(self, values: List[Dict[str, Any]], ctx: FetchContext):
-        with self.dbti.engine.connect() as conn:
+        with self.dbti.unit_of_work(write=True) as conn:
             result = conn.execute(insert(self.table), [self._row_from_values(v) for v in values])
-            conn.commit()
-        return self.dbti.schema.load_records(ctx, [tuple(pk) for pk in result.inserted_primary_key_rows])
+            return self.dbti.schema.load_records(ctx, [tuple(pk) for pk in result.inserted_primary_key_rows])
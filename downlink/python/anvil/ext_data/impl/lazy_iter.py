@@ -28,9 +28,11 @@ def iter_page(iter_name: str):
     return wrap
 
 
-def make_iterable(iter_name: str, iter_spec: IterSpec, first_page: Optional[Iterable] = None):
+def make_iterable(iter_name: str, iter_spec: IterSpec, first_page: Optional[Iterable] = None,
+                  next_cursor: Optional[Cursor] = None):
     cap_first_page = anvil.server.Capability(["anvil.ext_iter", iter_name, iter_spec, None])
-    cap_second_page = None
+    # If you supply the first page, supply the cursor for the page after it (or None if that's everything)
+    cap_second_page = Capability(["anvil.ext_iter", iter_name, iter_spec, next_cursor]) if next_cursor else None
     get_next_page = _local_page_funcs.get(iter_name, functools.partial(anvil.server.call, "ext.iter:"+iter_name))
     if first_page is None:
         # None means "fetch it yourself"
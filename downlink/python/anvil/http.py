@@ -1,6 +1,22 @@
 import anvil.server
+import anvil.media
 
 import json as json_mod
+import base64
+import ssl
+import threading
+import zlib
+import http.client
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote, unquote, urljoin, urlsplit
+
+DEFAULT_TIMEOUT = 60 # seconds
+MAX_REDIRECTS = 10
+MAX_IDLE_CONNECTIONS_PER_HOST = 4
+MAX_CONCURRENCY = 8
+
+# If set, requests are made from this process rather than through the Anvil server
+_local = False
 
 class HttpErrorStatus(Exception):
     "Represents an HTTP error response (eg 404 Not Found)"
@@ -29,6 +45,169 @@ anvil.server._register_exception_type("anvil.http.HttpRequestFailed", HttpReques
 def _has_content(method):
     return method != "GET" and method != "HEAD"
 
+
+class _ConnectionPool(object):
+    # Idle keep-alive connections, by (scheme, host, port)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = {}
+
+    def get(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+        if conn is None:
+            scheme, host, port = key
+            cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            return cls(host, port, timeout=timeout)
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn
+
+    def put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_CONNECTIONS_PER_HOST:
+                idle.append(conn)
+                return
+        conn.close()
+
+
+_pool = _ConnectionPool()
+
+
+def _replace_query(url, data):
+    # Like the Anvil server, a GET/HEAD with string data sends it as the query string (unless the URL has one)
+    parts = urlsplit(url)
+    if parts.query or not isinstance(data, str):
+        return url
+    return parts._replace(query=data).geturl()
+
+
+def _decode_content(content, encoding):
+    if encoding == "gzip":
+        return zlib.decompress(content, 16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+    return content
+
+
+def _send(method, url, headers, make_body, timeout):
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https"):
+        raise HttpRequestFailed("Unsupported URL: %s" % url)
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+    except ValueError as e:
+        raise HttpRequestFailed(str(e))
+    key = (parts.scheme, parts.hostname, port)
+    path = (parts.path or "/") + ("?" + parts.query if parts.query else "")
+
+    for attempt in (0, 1):
+        conn = _pool.get(key, timeout)
+        reused = conn.sock is not None
+        body = make_body()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            content = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if reused and attempt == 0:
+                # The server closed this connection while it was idle. Try again on a new one.
+                continue
+            raise HttpRequestFailed(str(e))
+        except ssl.SSLError as e:
+            conn.close()
+            raise HttpRequestFailed("SSL error: %s" % e)
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise HttpRequestFailed(str(e) or type(e).__name__)
+        finally:
+            # Media bodies are file objects (see anvil.media.open)
+            close_body = getattr(body, "close", None)
+            if close_body is not None:
+                close_body()
+
+        if resp.will_close:
+            conn.close()
+        else:
+            _pool.put(key, conn)
+
+        resp_headers = {}
+        for k, v in resp.getheaders():
+            k = k.lower()
+            resp_headers[k] = resp_headers[k] + ", " + v if k in resp_headers else v
+        try:
+            content = _decode_content(content, resp_headers.get("content-encoding", "").lower())
+        except zlib.error as e:
+            raise HttpRequestFailed("Invalid compressed response: %s" % e)
+        return resp.status, resp_headers, content
+
+
+def _local_request(url, method, data, headers, username, password, timeout):
+    # Make the request from this process, behaving as the Anvil server's "anvil.private.http.request" does
+    headers = dict((str(k).lower(), v) for k, v in headers.items())
+    headers.setdefault("accept-encoding", "gzip, deflate")
+    if username:
+        credentials = ("%s:%s" % (username, password or "")).encode("utf-8")
+        headers["authorization"] = "Basic " + base64.b64encode(credentials).decode("ascii")
+
+    content_type = None
+    if isinstance(data, dict):
+        if "content-type" in headers:
+            data = json_mod.dumps(data)
+        else:
+            data = "&".join("%s=%s" % (url_encode(str(k)), url_encode(str(v))) for k, v in data.items())
+            content_type = "application/x-www-form-urlencoded"
+    elif isinstance(data, anvil.Media):
+        content_type = data.content_type
+    elif isinstance(data, (list, tuple)):
+        raise anvil.server.AnvilWrappedError("Cannot use a list as the body of an HTTP request")
+    elif data is not None and not isinstance(data, (str, bytes)):
+        raise anvil.server.AnvilWrappedError("Cannot use '%s' as the body of an HTTP request" % type(data).__name__)
+    if content_type:
+        headers["content-type"] = content_type
+
+    if not _has_content(method):
+        url = _replace_query(url, data)
+        data = None
+
+    for _ in range(MAX_REDIRECTS + 1):
+        if isinstance(data, anvil.Media):
+            headers["content-length"] = str(data.get_length())
+            media = data
+            make_body = lambda: anvil.media.open(media)
+        else:
+            body = data.encode("utf-8") if isinstance(data, str) else data
+            make_body = lambda: body
+
+        status, resp_headers, content = _send(method, url, headers, make_body, timeout / 1000.0 if timeout else DEFAULT_TIMEOUT)
+
+        location = resp_headers.get("location")
+        if status not in (301, 302, 303, 307, 308) or location is None:
+            return {"status": status, "headers": resp_headers,
+                    "content": anvil.BlobMedia(resp_headers.get("content-type"), content)}
+
+        url = urljoin(url, location)
+        if status in (301, 302, 303) and method not in ("GET", "HEAD"):
+            method = "GET"
+            data = None
+            for h in ("content-type", "content-length"):
+                headers.pop(h, None)
+
+    raise HttpRequestFailed("Too many redirects")
+
+
+#!defFunction(anvil.http,_,[enabled=True])!2: "Make HTTP requests directly from this Python process, reusing connections, rather than sending each one through the Anvil server." ["use_local_client"]
+def use_local_client(enabled=True):
+    global _local
+    _local = bool(enabled)
+
 #!defFunction(anvil.http,_,url,[method="GET"],[data=None],[json=False],[headers=None],[username=None],[password=None],[timeout=None])!2: 
 # {
 #   $doc: "Make an HTTP request to the specified URL.",
@@ -57,16 +236,19 @@ def request(url, method='GET', data=None, headers=None, username=None, password=
             raise TypeError("timeout must be a number")
         timeout = timeout * 1000
 
-    resp = anvil.server.call(
-        "anvil.private.http.request",
-        url=url,
-        method=method,
-        data=data,
-        headers=headers,
-        username=username,
-        password=password,
-        timeout=timeout,
-    )
+    if _local:
+        resp = _local_request(url, method, data, headers, username, password, timeout)
+    else:
+        resp = anvil.server.call(
+            "anvil.private.http.request",
+            url=url,
+            method=method,
+            data=data,
+            headers=headers,
+            username=username,
+            password=password,
+            timeout=timeout,
+        )
     # Parse JSON if we have it
 
     if json:
@@ -87,13 +269,40 @@ def request(url, method='GET', data=None, headers=None, username=None, password=
     return resp["content"]
 
 
+#!defFunction(anvil.http,_,requests,[max_concurrency=8])!2: "Make several HTTP requests at once. Each request is a URL, or a dict of keyword arguments for request(). Returns a list of their results, in order, or raises the error from the first request that failed." ["request_many"]
+def request_many(requests, max_concurrency=MAX_CONCURRENCY):
+    requests = [{"url": r} if isinstance(r, str) else dict(r) for r in requests]
+    if len(requests) <= 1 or max_concurrency <= 1:
+        return [request(**r) for r in requests]
+
+    try:
+        from anvil._threaded_server import capture_call_info
+        restore_call_info = capture_call_info()
+    except ImportError:
+        restore_call_info = lambda: None
+
+    def run(kwargs):
+        restore_call_info()
+        return request(**kwargs)
+
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(requests))) as pool:
+        futures = [pool.submit(run, r) for r in requests]
+        wait(futures)
+        return [future.result() for future in futures]
+
+
+# These match the Anvil server's encoding: everything but A-Z a-z 0-9 _ ~ . - is percent-encoded as UTF-8
+
 #!defFunction(anvil.http,_,string_to_encode)!2: "URL-encode a string" ["url_encode"]
 def url_encode(string_to_encode):
-    return anvil.server.call("anvil.private.http.url_encode", string_to_encode)
+    return quote(str(string_to_encode), safe="~")
 
 #!defFunction(anvil.http,_,string_to_encode)!2: "URL-decode a string. Raises UrlEncodingError on failure." ["url_decode"]
 def url_decode(string_to_decode):
-    return anvil.server.call("anvil.private.http.url_decode", string_to_decode)
+    try:
+        return unquote(string_to_decode, errors="strict")
+    except (UnicodeDecodeError, TypeError):
+        raise UrlEncodingError("This is not a valid URL-encoded string")
 
 
 #!defClass(anvil.http,UrlEncodingError)!0:
@@ -4,6 +4,8 @@ import sys
 import anvil
 import tempfile
 import io
+import mmap
+import shutil
 
 open_ = open
 
@@ -17,8 +19,7 @@ class TempFile():
     def __enter__(self):
         self._filename = tempfile.gettempdir() + os.sep + "".join([random.choice("1234567890abcdefghijklmnopqrstuvwxyz") for i in range(32)])
         if self._media is not None:
-            with open_(self._filename, "wb") as f:
-                f.write(self._media.get_bytes())
+            write_to_file(self._media, self._filename)
         return self._filename
 
     #!defMethod(_)!2: "" ["__exit__"]
@@ -31,17 +32,122 @@ class TempFile():
 #!defClass(anvil.media,%TempFile)!:
 
 
+class _FileReader(io.RawIOBase):
+    # Reads the first `length` bytes of a FileMedia's file with pread(), so each reader has its own position.
+    # Unlike an mmap, reading a file that has been truncated can't crash the process. We keep a reference to
+    # the media, so its file (and therefore our fd) stays open for as long as we do.
+    def __init__(self, media):
+        self._media = media
+        self._fd = media._file.fileno()
+        self._length = media._length
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self._length + offset
+        else:
+            raise ValueError("Invalid whence (%r)" % whence)
+        if pos < 0:
+            raise ValueError("Negative seek position %d" % pos)
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        n = min(len(b), self._length - self._pos)
+        if n <= 0:
+            return 0
+        data = os.pread(self._fd, n, self._pos)
+        b[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        self._media = None
+        super(_FileReader, self).close()
+
+
+class FileMedia(anvil.Media):
+
+    #!defMethod(_,filename,[mime_type],[name])!2: "Create a Media object that reads its contents from a file when they are needed, rather than copying them into memory. The file must not be modified while the FileMedia is in use. It may be deleted." ["__init__"]
+    def __init__(self, filename, mime_type=None, name=None):
+        # Keep the file open, so we can still read it if it's deleted (eg by a TempFile) before we're done with it
+        self._file = open_(filename, "rb")
+        self._path = filename
+        self._length = os.fstat(self._file.fileno()).st_size
+        self._content_type = mime_type
+        self._name = name or filename.split(os.sep)[-1]
+
+    def get_content_type(self):
+        return self._content_type
+
+    def get_name(self):
+        return self._name
+
+    def get_length(self):
+        return self._length
+
+    def _check_unchanged(self):
+        if os.fstat(self._file.fileno()).st_size != self._length:
+            raise IOError("The file behind this FileMedia (%s) has changed size since it was created" % self._path)
+
+    def get_bytes(self):
+        self._check_unchanged()
+        if self._length == 0:
+            return b""
+        with mmap.mmap(self._file.fileno(), self._length, access=mmap.ACCESS_READ) as m:
+            return m[:]
+
+    def _open(self):
+        self._check_unchanged()
+        if not hasattr(os, "pread"):
+            return io.BytesIO(self.get_bytes())
+        return io.BufferedReader(_FileReader(self))
+
+    def __repr__(self):
+        return "FileMedia[%s,%d bytes,name=%s]" % (self._content_type, self._length, self._name)
+#!defClass(anvil.media,%FileMedia, anvil.Media)!:
+
+
 #!defFunction(anvil.media,%anvil.Media instance,filename,[mime_type],[name])!2: "Creates a Media object from the given file." ["from_file"]
 def from_file(filename, mime_type=None, name=None):
+    # A snapshot of the file as it is now. Use FileMedia to avoid reading large files into memory.
     with open_(filename, "rb") as f:
         return anvil.BlobMedia(mime_type, f.read(), name=(name or filename.split(os.sep)[-1]))
 
 #!defFunction(anvil.media,_,media,filename)!2: "Write a Media object to the given file" ["write_to_file"]
 def write_to_file(media, filename):
     with open_(filename, "wb") as f:
-        f.write(media.get_bytes())
+        if isinstance(media, FileMedia) and hasattr(os, "sendfile"):
+            media._check_unchanged()
+            # Copy file-to-file in the kernel. Passing an offset leaves the source file's position alone.
+            offset = 0
+            while offset < media._length:
+                sent = os.sendfile(f.fileno(), media._file.fileno(), offset, media._length - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            return
+        with open(media) as src:
+            shutil.copyfileobj(src, f)
 
 
-#!defFunction(anvil.media,%BytesIO, media)!2: "Open a media file as Python BytesIO object" ["open"]
+#!defFunction(anvil.media,%file object, media)!2: "Open a Media object as a readable, seekable binary file object. Small media give a BytesIO; large or file-backed media are read from where they are rather than loaded into memory. Close it (or use a with block) when you are done." ["open"]
 def open(media):
+    # Media received from a server call may be too big to hold in memory, so read it from where it is
+    opener = getattr(media, "_open", None)
+    if opener is not None:
+        return opener()
     return io.BytesIO(media.get_bytes())
\ No newline at end of file
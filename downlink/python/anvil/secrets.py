@@ -1,8 +1,61 @@
 import anvil.server
+import threading
+from time import time
+
+MAX_CACHE_ENTRIES = 10000
+
+# Opt-in cache of secrets and decrypted values in this process. Disabled when _cache_ttl is None.
+_cache_ttl = None
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+anvil.server._on_invalidate_client_objects(_clear_cache)
+
+
+def _get_cached(key, now):
+    with _cache_lock:
+        entry = _cache.get(key)
+    if entry is not None and entry[1] > now:
+        return True, entry[0]
+    return False, None
+
+
+def _set_cached(items, now):
+    expires = now + _cache_ttl
+    with _cache_lock:
+        if len(_cache) + len(items) > MAX_CACHE_ENTRIES:
+            for key in [key for key, (_, e) in _cache.items() if e <= now]:
+                del _cache[key]
+            if len(_cache) + len(items) > MAX_CACHE_ENTRIES:
+                _cache.clear()
+        for key, value in items:
+            _cache[key] = (value, expires)
+
+
+#!defFunction(anvil.secrets,_,[ttl=60])!2: "Cache secrets and decrypted values in this Python process for ttl seconds, rather than fetching them every time. Pass None to stop caching." ["cache_secrets"]
+def cache_secrets(ttl=60):
+    global _cache_ttl
+    _cache_ttl = ttl
+    if ttl is None:
+        _clear_cache()
+
 
 #!defFunction(anvil.secrets,_,secret_name)!2: "Retrieve the named secret" ["get_secret"]
 def get_secret(secret_name):
-    return anvil.server.call("anvil.private.secrets.get_secret", secret_name)
+    if _cache_ttl is None:
+        return anvil.server.call("anvil.private.secrets.get_secret", secret_name)
+    now = time()
+    found, value = _get_cached(("secret", secret_name), now)
+    if not found:
+        value = anvil.server.call("anvil.private.secrets.get_secret", secret_name)
+        _set_cached([(("secret", secret_name), value)], now)
+    return value
 
 #!defFunction(anvil.secrets,_,key_name,value)!2: "Encrypt a string with a cryptographic key derived from the named secret" ["encrypt_with_key"]
 def encrypt_with_key(key_name, value):
@@ -10,7 +63,37 @@ def encrypt_with_key(key_name, value):
 
 #!defFunction(anvil.secrets,_,key_name,value)!2: "Decrypt a string with a cryptographic key derived from the named secret" ["decrypt_with_key"]
 def decrypt_with_key(key_name, value):
-    return anvil.server.call("anvil.private.secrets.decrypt_with_key", key_name, value)
+    return decrypt_many(key_name, [value])[0]
+
+#!defFunction(anvil.secrets,_,key_name,values)!2: "Encrypt a list of strings with a cryptographic key derived from the named secret, returning a list" ["encrypt_many"]
+def encrypt_many(key_name, values):
+    values = list(values)
+    if not values:
+        return []
+    return anvil.server.call("anvil.private.secrets.encrypt_many", key_name, values)
+
+def _fetch_decrypted(key_name, values):
+    if len(values) == 1:
+        return [anvil.server.call("anvil.private.secrets.decrypt_with_key", key_name, values[0])]
+    return anvil.server.call("anvil.private.secrets.decrypt_many", key_name, values) if values else []
+
+#!defFunction(anvil.secrets,_,key_name,values)!2: "Decrypt a list of strings with a cryptographic key derived from the named secret, returning a list" ["decrypt_many"]
+def decrypt_many(key_name, values):
+    values = list(values)
+    if _cache_ttl is None:
+        return _fetch_decrypted(key_name, values)
+
+    now = time()
+    results = {}
+    for value in values:
+        found, plaintext = _get_cached(("decrypt", key_name, value), now)
+        if found:
+            results[value] = plaintext
+    missing = list(dict.fromkeys(value for value in values if value not in results))
+    fetched = _fetch_decrypted(key_name, missing)
+    results.update(zip(missing, fetched))
+    _set_cached([(("decrypt", key_name, value), plaintext) for value, plaintext in zip(missing, fetched)], now)
+    return [results[value] for value in values]
 
 
 #!defClass(anvil.secrets,SecretError)!:
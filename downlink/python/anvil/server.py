@@ -47,6 +47,8 @@ from ._server import (register,
                       get_subscriptions,
                       invalidate_client_objects,
                       _on_invalidate_client_objects,
+                      _on_call_complete,
+                      _on_outbound_call,
                       server_method)
 
 from . import _threaded_server, _server
@@ -36,10 +36,20 @@
 (defn decrypt-with-secret [_kwargs key-name ciphertext]
   (runtime-secrets/decrypt-str (get-encryption-key key-name) ciphertext))
 
+(defn encrypt-many-with-secret [_kwargs key-name plaintexts]
+  (let [key (get-encryption-key key-name)]
+    (mapv #(runtime-secrets/encrypt-str key %) plaintexts)))
+
+(defn decrypt-many-with-secret [_kwargs key-name ciphertexts]
+  (let [key (get-encryption-key key-name)]
+    (mapv #(runtime-secrets/decrypt-str key %) ciphertexts)))
+
 (swap! dispatcher/native-rpc-handlers merge
        {"anvil.private.secrets.get_secret"       (wrap-no-uplink get-secret)
         "anvil.private.secrets.encrypt_with_key" (wrap-no-uplink encrypt-with-secret)
-        "anvil.private.secrets.decrypt_with_key" (wrap-no-uplink decrypt-with-secret)})
+        "anvil.private.secrets.decrypt_with_key" (wrap-no-uplink decrypt-with-secret)
+        "anvil.private.secrets.encrypt_many"     (wrap-no-uplink encrypt-many-with-secret)
+        "anvil.private.secrets.decrypt_many"     (wrap-no-uplink decrypt-many-with-secret)})
 
 
 ;; Backend for other secret storage
@@ -15,7 +15,8 @@
             [clojure.java.io :as io])
   (:import (java.sql Connection Blob)
            (java.util Collections)
-           (java.io SequenceInputStream ByteArrayInputStream ByteArrayOutputStream)
+           (java.util.zip GZIPOutputStream)
+           (java.io SequenceInputStream ByteArrayInputStream ByteArrayOutputStream InputStream)
            (anvil.dispatcher.types MediaDescriptor Media)))
 
 (defn- load-combined-blob-media [db-c {:keys [storage] :as table-record} col-id-kw col-values]
@@ -145,18 +146,45 @@
                                       (.close raw-conn)
                                       '()))))))
 
-(defn get-csv-filename [tables table-id]
-  (let [table-name (get-in tables [table-id :name])]
-    (str (.replaceAll ^String (or table-name "export") "[^A-Za-z0-9\\. ]" "") ".csv")))
+(defn- gzip-input-stream
+  "Compress an InputStream as it is read, without holding the whole output in memory"
+  [^InputStream in]
+  (let [buf (ByteArrayOutputStream.)
+        gz (GZIPOutputStream. buf)
+        chunk (byte-array 65536)
+        drain (fn []
+                (let [bytes (.toByteArray buf)]
+                  (.reset buf)
+                  (ByteArrayInputStream. bytes)))
+        chunks (fn chunks []
+                 (lazy-seq
+                   (let [n (.read in chunk)]
+                     (if (neg? n)
+                       (do (.close gz)
+                           (.close in)
+                           (list (drain)))
+                       (do (.write gz chunk 0 n)
+                           (cons (drain) (chunks)))))))]
+    (SequenceInputStream. (Collections/enumeration (chunks)))))
 
-(defn serve-query-csv-lazy-media [tables db-c table-id query-obj cols escape-for-excel?]
+(defn get-csv-filename
+  ([tables table-id] (get-csv-filename tables table-id false))
+  ([tables table-id gzip?]
+   (let [table-name (get-in tables [table-id :name])]
+     (str (.replaceAll ^String (or table-name "export") "[^A-Za-z0-9\\. ]" "") (if gzip? ".csv.gz" ".csv")))))
+
+(defn get-csv-content-type [gzip?]
+  (if gzip? "application/gzip" "text/csv"))
+
+(defn serve-query-csv-lazy-media [tables db-c table-id query-obj cols escape-for-excel? gzip?]
   (reify
     MediaDescriptor
-    (getName [_this] (get-csv-filename tables table-id))
-    (getContentType [_this] "text/csv")
+    (getName [_this] (get-csv-filename tables table-id gzip?))
+    (getContentType [_this] (get-csv-content-type gzip?))
     Media
     (getLength [_this] 0)
     (getInputStream [_this]
       ;; We have to re-do the binding here, because this is likely to be called
       ;; from another thread.
-      (export-as-csv tables db-c table-id query-obj cols escape-for-excel?))))
+      (cond-> (export-as-csv tables db-c table-id query-obj cols escape-for-excel?)
+        gzip? (gzip-input-stream)))))
@@ -180,12 +180,18 @@
 
 (def CHUNK-SIZE 100)
 
-(defn search-get-page [_kws cap & _args]
+(defn search-get-page [{:keys [page_size offset] :as _kws} cap & _args]
+  ;; page_size overrides the search's page size for this page only (eg to fetch all remaining rows at once)
+  ;; offset skips that many rows, to jump straight to an index rather than paging through
+  (when-not (or (nil? page_size) (and (number? page_size) (pos? page_size)))
+    (throw+ (util-v2/general-tables-error (str "Page size must be a positive number."))))
+  (when-not (or (nil? offset) (and (integer? offset) (not (neg? offset))))
+    (throw+ (util-v2/general-tables-error (str "Search offset must be a non-negative integer."))))
   (let [tables (util-v2/get-tables)
         [encoded-view-spec encoded-search-spec encoded-cursor] (util-v2/unwrap-cap cap :search)
         {:keys [search fetch order chunk]} (decode-search-spec encoded-search-spec)
-        chunk-size (or chunk CHUNK-SIZE)
-        [table-data row-ids cursor] (search-v2/get-page tables (db) (decode-view-spec encoded-view-spec) fetch search order chunk-size (decode-cursor encoded-cursor))]
+        chunk-size (or page_size chunk CHUNK-SIZE)
+        [table-data row-ids cursor] (search-v2/get-page tables (db) (decode-view-spec encoded-view-spec) fetch search order chunk-size (decode-cursor encoded-cursor) offset)]
     [row-ids (when cursor (types/->Capability ["_" "t" encoded-view-spec encoded-search-spec (encode-cursor cursor)])) table-data]))
 
 (defn search-get-length [_kws cap]
@@ -365,35 +371,49 @@
         row-id (basic-ops/validate-clean-row-id row-id table-id)]
     (basic-ops/table-has-row? tables (db) view-spec row-id)))
 
-(defn- get-csv-lazy-media [tables {table-id :id :keys [cols restrict] :as _view-spec} query escape-for-excel?]
+(defn- select-csv-cols [tables table-id cols columns]
+  (if (nil? columns)
+    cols
+    (let [available (set (or cols (keys (get-in tables [table-id :columns]))))]
+      (when-not (and (sequential? columns) (every? string? columns))
+        (throw+ (util-v2/general-tables-error "columns must be a list of column names")))
+      (doseq [col columns]
+        (when-not (contains? available col)
+          (throw+ (util-v2/general-tables-error (str "No such column '" col "'") "anvil.tables.NoSuchColumnError"))))
+      (distinct columns))))
+
+(defn- get-csv-lazy-media [tables {table-id :id :keys [cols restrict] :as _view-spec} query {:keys [escape_for_excel columns gzip]}]
   (let [query (query/both-queries restrict query)
+        cols (select-csv-cols tables table-id cols columns)
         ;; Enforce client_hidden filtering for client-originated CSV exports only.
         ;; Server-side exports should preserve their existing column semantics.
         cols (if rpc-util/*client-request?*
                (basic-ops/get-col-names-removing-client-hidden table-id tables cols)
-               cols)]
-    (lazy-media/mk-LazyMedia-with-correct-mac {:manager   "query-csv-v2", :id (util/write-json-str [table-id query cols escape-for-excel?]),
-                                               :mime-type "text/csv", :name (export/get-csv-filename tables table-id)}
+               cols)
+        gzip? (boolean gzip)]
+    (lazy-media/mk-LazyMedia-with-correct-mac {:manager   "query-csv-v2", :id (util/write-json-str (cond-> [table-id query cols escape_for_excel]
+                                                                                                          gzip? (conj gzip?))),
+                                               :mime-type (export/get-csv-content-type gzip?), :name (export/get-csv-filename tables table-id gzip?)}
                                               rpc-util/*req*)))
 
-(defn table-to-csv [{:keys [escape_for_excel]} table-cap]
+(defn table-to-csv [kwargs table-cap]
   (let [tables (util-v2/get-tables)
         view-spec (-> (unwrap-cap-with-perm! tables table-cap :table util-v2/READ)
                       (first)
                       (decode-view-spec))]
-    (get-csv-lazy-media tables view-spec nil escape_for_excel)))
+    (get-csv-lazy-media tables view-spec nil kwargs)))
 
-(defn search-to-csv [{:keys [escape_for_excel]} search-cap]
+(defn search-to-csv [kwargs search-cap]
   (let [tables (util-v2/get-tables)
         [encoded-view-spec encoded-search-spec] (util-v2/unwrap-cap search-cap :search)
         {:keys [search]} (decode-search-spec encoded-search-spec)
         view-spec (decode-view-spec encoded-view-spec)]
-    (get-csv-lazy-media tables view-spec search escape_for_excel)))
+    (get-csv-lazy-media tables view-spec search kwargs)))
 
 (defn serve-csv-lazy-media [media-id]
   (let [tables (util-v2/get-tables)
-        [table-id query cols escape-for-excel?] (json/read-str media-id :key-fn keyword)]
-    (export/serve-query-csv-lazy-media tables (db) table-id query cols escape-for-excel?)))
+        [table-id query cols escape-for-excel? gzip?] (json/read-str media-id :key-fn keyword)]
+    (export/serve-query-csv-lazy-media tables (db) table-id query cols escape-for-excel? gzip?)))
 
 (defn serve-split-table-media [media-id]
   (let [[table-id row-id col-id] (util/read-json-str media-id)]
@@ -418,8 +438,30 @@
                                  :type (or (#{"string" "number" "bool" "date" "datetime" "media"} type)
                                            "object")})})}))
 
+(defn- with-piggybacked-transaction
+  "A client Transaction can open with its first tables call and commit with its last,
+   rather than making dedicated open_transaction/close_transaction calls."
+  [f]
+  (fn [{:keys [_open_transaction _close_transaction] :as kwargs} & args]
+    (let [kwargs (dissoc kwargs :_open_transaction :_close_transaction)]
+      (when _open_transaction
+        (old-tables-util/open-app-transaction! {:isolation _open_transaction}))
+      (let [result (try
+                     (apply f kwargs args)
+                     (catch Throwable e
+                       ;; The client doesn't close a transaction it asked us to commit, so roll it back here
+                       (when _close_transaction
+                         (try
+                           (old-tables-util/close-app-transaction! {} true)
+                           (catch Throwable _e)))
+                       (throw e)))]
+        (when _close_transaction
+          (old-tables-util/close-app-transaction! {} false))
+        result))))
+
 (defn- wrap-native-fn [f]
-  (rpc-util/wrap-native-fn #(old-tables-util/with-transform-err (apply f %&)) :db-time))
+  (let [f (with-piggybacked-transaction f)]
+    (rpc-util/wrap-native-fn #(old-tables-util/with-transform-err (apply f %&)) :db-time)))
 
 (defn- NOT-IMPLEMENTED!
   ([] (NOT-IMPLEMENTED! nil))
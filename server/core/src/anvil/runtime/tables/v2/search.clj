@@ -23,7 +23,7 @@
 
 ;; 4. Generate SELECT clause
 
-(defn PRIMARY-QUERY [tables table-id fetch-spec query order-by chunk-size cursor]
+(defn PRIMARY-QUERY [tables table-id fetch-spec query order-by chunk-size cursor & [offset]]
   (let [order-by-with-ids (for [{:keys [column_name ascending]} order-by]
                             {:col-id (get-in tables [table-id :columns column_name :id])
                              :desc   (not ascending)})
@@ -42,7 +42,8 @@
     [(str "SELECT " ID-COL " AS id, " SELECT-EXPR " AS rdata, 0 AS fid, ROW_NUMBER() OVER (ORDER BY " ORDER-BY-EXPR ") AS primary_order FROM " TABLE-NAME
           " WHERE " TABLE-ID-SQL " AND " WHERE-EXPR
           (when cursor (str " AND " CURSOR-EXPR))
-          " ORDER BY " ORDER-BY-EXPR " LIMIT " (int chunk-size))
+          " ORDER BY " ORDER-BY-EXPR " LIMIT " (int chunk-size)
+          (when (and offset (pos? offset)) (str " OFFSET " (long offset))))
      (concat select-params order-by-params table-id-args where-params cursor-params order-by-params)]))
 
 (defn COUNT-QUERY [tables table-id query]
@@ -106,11 +107,12 @@
           (get rdata (keyword column_name)))
         [id]))))
 
-(defn get-page [tables db-c {table-id :id, :keys [restrict] :as view-spec} requested-cols query order-by chunk-size cursor]
+(defn get-page [tables db-c {table-id :id, :keys [restrict] :as view-spec} requested-cols query order-by chunk-size cursor & [offset]]
+  ;; offset skips rows after the cursor, so a client can jump to a page without fetching the ones before it
   (let [query (query/both-queries query restrict)
         requested-cols (include-order-by-cols requested-cols order-by)
         fetch-spec (basic-ops/compute-fetch-spec tables view-spec requested-cols)
-        PRIMARY-QUERY (PRIMARY-QUERY tables table-id fetch-spec query order-by chunk-size cursor)
+        PRIMARY-QUERY (PRIMARY-QUERY tables table-id fetch-spec query order-by chunk-size cursor offset)
 
         {:keys [table-data primary-row-ids last-primary-row]}
         (basic-ops/walk-and-fetch-table-links tables db-c view-spec PRIMARY-QUERY fetch-spec)
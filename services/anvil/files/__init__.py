@@ -5,19 +5,27 @@ if not anvil.is_server_side():
 
 import anvil.server
 import anvil.media
+import anvil.tables.query as q
 from anvil.tables.v2 import app_tables
-from tempfile import gettempdir, mkdtemp
+from tempfile import gettempdir
 import os
 import shutil
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 try:
     import sqlite3
 except ModuleNotFoundError:
     raise RuntimeError("anvil.files cannot be used in basic Python, Try selecting a different Python version.")
 from time import time, sleep
-from contextlib import contextmanager
-from uuid import uuid4
+from contextlib import contextmanager, ExitStack
 import logging
 import sys
+try:
+    import fcntl
+except ImportError:
+    # No cross-process file locks (eg on Windows). Waiting for downloads falls back to polling, and pins are ignored.
+    fcntl = None
 
 logger = logging.getLogger(__name__)
 
@@ -34,6 +42,29 @@ def enable_debug_logging():
 
 MAX_REMOTE_METADATA_AGE = 5
 DOWNLOAD_TIMEOUT = 5
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_PARALLEL_DOWNLOADS = 4
+MAX_CACHE_SIZE = None # bytes per table, or None for no limit
+
+
+def _hash_file(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _path_and_parents(path):
+    parts = path.split("/")
+    return ["/".join(parts[:i]) for i in range(len(parts), 0, -1)]
+
+
+def _is_content_hash(file_version):
+    # File versions are the sha256 of the file's contents. Older files have random (uuid) versions.
+    return isinstance(file_version, str) and len(file_version) == 64 and all(c in "0123456789abcdef" for c in file_version)
+
+
 try:
     FILES_TABLE = getattr(app_tables, "files") # TODO: Get table name from server config
 except AttributeError:
@@ -49,21 +80,205 @@ class Files(object):
         except OSError:
             pass
         self._cache_dir = os.path.join(self._temp_dir, "table-%s" % self._table_id)
+        self._partial_dir = os.path.join(self._temp_dir, "table-%s-partial" % self._table_id)
+        self._lock_dir = os.path.join(self._temp_dir, "table-%s-locks" % self._table_id)
+        self._progress_handler = None
+        self._max_cache_size = MAX_CACHE_SIZE
         
         self._db_path = os.path.join(self._temp_dir, "anvil-data-files-metadata.db")
+        self._local = threading.local()
         db = self._get_db()
         cur = db.cursor()
+        # WAL lets lookups in other threads and processes read while we write
+        cur.execute("PRAGMA journal_mode=WAL")
         cur.execute("CREATE TABLE IF NOT EXISTS tables (table_id PRIMARY KEY, last_fetched)")
         cur.execute("CREATE TABLE IF NOT EXISTS local_files (table_id, path, local_file_version, status, remote_file_version, last_touched, PRIMARY KEY (table_id, path) on conflict fail)")
         cur.execute("CREATE TABLE IF NOT EXISTS remote_files (table_id, path, file_version, PRIMARY KEY (table_id, path))")
         db.commit()
 
     def _get_db(self):
-        db = sqlite3.connect(self._db_path)
-        db.row_factory = sqlite3.Row
+        # One connection per thread, reused for every lookup
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self._db_path)
+            db.row_factory = sqlite3.Row
         return db
 
+    def _sync_remote_metadata(self, db):
+        # Only fetch path and version, and only write the rows that have changed
+        remote_versions = dict((file['path'], file['file_version'])
+                               for file in FILES_TABLE.search(q.fetch_only("path", "file_version")))
+        local_versions = dict((row['path'], row['file_version']) for row in
+                              db.execute("SELECT path, file_version FROM remote_files WHERE table_id = ?", [self._table_id]))
+
+        changed = [(self._table_id, path, version) for path, version in remote_versions.items()
+                   if local_versions.get(path, Ellipsis) != version]
+        deleted = [(self._table_id, path) for path in local_versions if path not in remote_versions]
+        logger.debug("Remote file metadata: %d changed, %d deleted" % (len(changed), len(deleted)))
+
+        with db:
+            db.execute("INSERT OR REPLACE INTO tables (table_id, last_fetched) VALUES (?, ?)", [self._table_id, time()])
+            db.executemany("INSERT OR REPLACE INTO remote_files (table_id, path, file_version) VALUES (?, ?, ?)", changed)
+            db.executemany("DELETE FROM remote_files WHERE table_id = ? AND path = ?", deleted)
+
+    @contextmanager
+    def _lock(self, path, kind, exclusive=False, blocking=True):
+        # Yields whether we got the lock. flock() locks belong to the open file, so they work between threads too.
+        if fcntl is None:
+            yield True
+            return
+        lock_path = os.path.join(self._lock_dir, "%s.%s.lock" % (path, kind))
+        try:
+            os.makedirs(os.path.dirname(lock_path))
+        except OSError:
+            pass
+        f = open(lock_path, "a")
+        try:
+            try:
+                fcntl.flock(f.fileno(), (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if blocking else fcntl.LOCK_NB))
+                locked = True
+            except (IOError, OSError):
+                if blocking:
+                    raise
+                locked = False
+            yield locked
+        finally:
+            # Closing the file releases the lock
+            f.close()
+
+    def _wait_for_download(self, cur, path):
+        # Only needed without file locks (see __getitem__). Poll until the download finishes, or until it looks stalled.
+        while True:
+            cur.execute("SELECT * FROM local_files WHERE table_id = ? AND path = ?", [self._table_id, path])
+            local_file_metadata = cur.fetchone()
+            if local_file_metadata is None or local_file_metadata['status'] != 'DOWNLOADING' or \
+                    time() - (local_file_metadata['last_touched'] or 0) >= DOWNLOAD_TIMEOUT:
+                return local_file_metadata
+            logger.debug("Waiting for download to finish")
+            sleep(0.5)
+
+    #!defMethod(_, max_bytes)!2: "Limit the size of the local Data Files cache. Least recently used files are removed when it gets bigger than max_bytes. Pass None for no limit." ["set_max_cache_size"]
+    def set_max_cache_size(self, max_bytes):
+        self._max_cache_size = max_bytes
+        self._evict(self._get_db())
+
+    def _evict(self, db, keep=None):
+        if self._max_cache_size is None:
+            return
+        cur = db.execute("SELECT path FROM local_files WHERE table_id = ? AND status = 'PRESENT' ORDER BY last_touched DESC", [self._table_id])
+        sizes = []
+        for row in cur.fetchall():
+            try:
+                sizes.append((row['path'], os.path.getsize(os.path.join(self._cache_dir, row['path']))))
+            except OSError:
+                sizes.append((row['path'], 0))
+        total = sum(size for _, size in sizes)
+
+        for path, size in reversed(sizes):
+            if total <= self._max_cache_size:
+                break
+            if keep is not None and (path == keep or path.startswith(keep + "/")):
+                continue
+            with ExitStack() as stack:
+                # Files that are pinned (directly or by a folder above them) are in use
+                if not all(stack.enter_context(self._lock(p, "pin", exclusive=True, blocking=False)) for p in _path_and_parents(path)):
+                    logger.debug("Not evicting pinned file %s" % path)
+                    continue
+                logger.debug("Evicting %s" % path)
+                db.execute("DELETE FROM local_files WHERE table_id = ? AND path = ? AND status = 'PRESENT'", [self._table_id, path])
+                db.commit()
+                try:
+                    os.remove(os.path.join(self._cache_dir, path))
+                except OSError:
+                    pass
+            total -= size
+
+    def _log_db_state(self, cur):
+        logger.debug("")
+        logger.debug("TABLES")
+        cur.execute("SELECT * FROM tables")
+        for r in cur.fetchall():
+            logger.debug(dict(r))
+        logger.debug("REMOTE FILES")
+        cur.execute("SELECT * FROM remote_files")
+        for r in cur.fetchall():
+            logger.debug(dict(r))
+
+        logger.debug("LOCAL FILES")
+        cur.execute("SELECT * FROM local_files")
+        for r in cur.fetchall():
+            logger.debug(dict(r))
+        logger.debug("")
+
+    #!defMethod(_, handler)!2: "Call handler(path, bytes_downloaded, total_bytes) as files are downloaded. total_bytes is None if the size is not known." ["set_progress_handler"]
+    def set_progress_handler(self, handler):
+        self._progress_handler = handler
+
+    def _partial_path(self, path, file_version):
+        # Partial downloads are kept (outside the cache) so an interrupted download can pick up where it left off
+        return os.path.join(self._partial_dir, "%s.%s.anvildownload" % (path, file_version))
+
+    def _remove_stale_partials(self, path, keep):
+        # Only partials of this exact path: "<basename>.<version>.anvildownload", where a version (content hash
+        # or uuid) is hex digits and dashes. A prefix match would also catch "<basename>.csv.<version>...".
+        prefix = os.path.basename(path) + "."
+        suffix = ".anvildownload"
+        partial_folder = os.path.dirname(keep)
+        try:
+            names = os.listdir(partial_folder)
+        except OSError:
+            return
+        for name in names:
+            partial = os.path.join(partial_folder, name)
+            if not (name.startswith(prefix) and name.endswith(suffix)) or partial == keep:
+                continue
+            version = name[len(prefix):-len(suffix)]
+            if version and all(c in "0123456789abcdef-" for c in version.lower()):
+                try:
+                    os.remove(partial)
+                except OSError:
+                    pass
+
+    def _stream_to_file(self, media, partial_path, path):
+        # Copy the media to partial_path a chunk at a time, hashing it as we go. Media can't be fetched from an
+        # offset, so resuming re-reads (and skips) what we already have, but doesn't rewrite it.
+        sha = hashlib.sha256()
+        done = 0
+        try:
+            total = media.get_length()
+        except Exception:
+            total = None
+
+        if os.path.exists(partial_path):
+            with open(partial_path, "rb") as existing:
+                for chunk in iter(lambda: existing.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    sha.update(chunk)
+                    done += len(chunk)
+            logger.debug("Resuming download of %s from %d bytes" % (path, done))
+
+        src = anvil.media.open(media)
+        try:
+            to_skip = done
+            while to_skip > 0:
+                skipped = len(src.read(min(to_skip, DOWNLOAD_CHUNK_SIZE)))
+                if not skipped:
+                    break
+                to_skip -= skipped
+
+            with open(partial_path, "ab") as f:
+                for chunk in iter(lambda: src.read(DOWNLOAD_CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    sha.update(chunk)
+                    done += len(chunk)
+                    if self._progress_handler is not None:
+                        self._progress_handler(path, done, total)
+        finally:
+            src.close()
+
+        return sha.hexdigest()
+
     def download(self, db, remote_file_metadata):
+        # The caller holds this file's download lock (see __getitem__)
         path = remote_file_metadata['path']
         local_file_path = os.path.join(self._cache_dir, path)
         file_version = remote_file_metadata['file_version']
@@ -72,42 +287,96 @@ class Files(object):
                     [file_version, time(), self._table_id, path])
         db.commit()
         remote_file_row = FILES_TABLE.get(path=path)
-        d = mkdtemp()
+
+        partial_path = self._partial_path(path, file_version)
         try:
-            tempname = os.path.join(d, '%s.anvildownload' % path)
-            try:
-                os.makedirs(os.path.dirname(tempname))
-            except OSError:
-                pass
-            logger.debug("Downloading to %s" % tempname)
-            with open(tempname, 'wb+') as f:
-                # TODO: Periodically update last_touched while downloading
-                if remote_file_row['file']:
-                    f.write(remote_file_row['file'].get_bytes())
+            os.makedirs(os.path.dirname(partial_path))
+        except OSError:
+            pass
+        self._remove_stale_partials(path, partial_path)
 
-            try:
-                os.makedirs(os.path.dirname(local_file_path))
-            except OSError:
-                pass
-            os.rename(tempname, local_file_path)
-        finally:
-            shutil.rmtree(d, ignore_errors=True)
+        logger.debug("Downloading to %s" % partial_path)
+        # TODO: Periodically update last_touched while downloading
+        if remote_file_row['file']:
+            digest = self._stream_to_file(remote_file_row['file'], partial_path, path)
+        else:
+            open(partial_path, "wb").close()
+            digest = hashlib.sha256().hexdigest()
+
+        if _is_content_hash(file_version) and digest != file_version:
+            os.remove(partial_path)
+            raise Exception("Downloaded file does not match its version hash: %s" % path)
 
-        logger.debug("Downloaded %s to %s" % (path, local_file_path))
+        try:
+            os.makedirs(os.path.dirname(local_file_path))
+        except OSError:
+            pass
+        os.replace(partial_path, local_file_path)
+
+        logger.debug("Downloaded %s to %s (sha256 %s)" % (path, local_file_path, digest))
 
         db.execute("UPDATE local_files SET status='PRESENT', local_file_version = ?, last_touched = ? WHERE table_id = ? AND path = ?",
                     [file_version, time(), self._table_id, path])
         db.commit()
 
+    def _download_all(self, remote_files_metadata):
+        # Download a folder's files a few at a time. Each worker uses its own connection to the metadata DB.
+        if len(remote_files_metadata) <= 1 or MAX_PARALLEL_DOWNLOADS <= 1:
+            for remote_file_metadata in remote_files_metadata:
+                self.download(self._get_db(), remote_file_metadata)
+            return
+
+        try:
+            from anvil._threaded_server import capture_call_info
+            restore_call_info = capture_call_info()
+        except ImportError:
+            restore_call_info = lambda: None
+
+        def download(remote_file_metadata):
+            restore_call_info()
+            self.download(self._get_db(), remote_file_metadata)
+
+        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_DOWNLOADS) as pool:
+            futures = [pool.submit(download, m) for m in remote_files_metadata]
+            # Let every download finish (or fail) before raising the first error
+            wait(futures)
+            for future in futures:
+                future.result()
+
+    def _revalidate(self, db, remote_file_metadata):
+        # If the remote version is a content hash, a local copy with the same hash is up to date, whoever put it there
+        path = remote_file_metadata['path']
+        file_version = remote_file_metadata['file_version']
+        if not _is_content_hash(file_version):
+            return False
+        try:
+            if _hash_file(os.path.join(self._cache_dir, path)) != file_version:
+                return False
+        except (IOError, OSError):
+            return False
+        db.execute("UPDATE local_files SET status='PRESENT', local_file_version = ?, remote_file_version = ?, last_touched = ? WHERE table_id = ? AND path = ?",
+                   [file_version, file_version, time(), self._table_id, path])
+        db.commit()
+        return True
+
     def upload(self, db, path):
         # TODO: Cope with new files?
-        file_row = FILES_TABLE.get(path=path)
         local_file_path = os.path.join(self._cache_dir, path)
+        new_file_version = _hash_file(local_file_path)
+
+        cur = db.execute("SELECT file_version FROM remote_files WHERE table_id=? AND path=?", [self._table_id, path])
+        remote_file_metadata = cur.fetchone()
+        if remote_file_metadata is not None and remote_file_metadata['file_version'] == new_file_version:
+            logger.debug("%s is unchanged, not uploading" % path)
+            db.execute("UPDATE local_files SET status='PRESENT', last_touched=?, local_file_version=?, remote_file_version=? WHERE table_id=? AND path=?", [time(), new_file_version, new_file_version, self._table_id, path])
+            db.commit()
+            return
+
+        file_row = FILES_TABLE.get(path=path)
         logger.debug("Uploading %s" % path)
         db.execute("UPDATE local_files SET status='UPLOADING', last_touched=? WHERE table_id=? AND path=?", [time(), self._table_id, path])
         db.commit()
         file_row['file'] = anvil.media.from_file(local_file_path) # TODO: MIME type? Store in metadata?
-        new_file_version = str(uuid4()) # TODO: Proper content hash
         file_row['file_version'] = new_file_version
         logger.debug("Uploaded %s" % path)
         db.execute("UPDATE remote_files SET file_version=? WHERE table_id=? AND path=?", [new_file_version, self._table_id, path])
@@ -126,17 +395,16 @@ class Files(object):
         table_metadata = cur.fetchone()
         if table_metadata is None or time() - table_metadata['last_fetched'] > MAX_REMOTE_METADATA_AGE:
             logger.debug("Fetching remote file metadata")
-            db.execute("INSERT OR REPLACE INTO tables (table_id, last_fetched) VALUES (?, ?)", [self._table_id, time()])
-            db.execute("DELETE FROM remote_files WHERE table_id = ?", [self._table_id])
-            for file in FILES_TABLE.search():
-                db.execute("INSERT INTO remote_files (table_id, path, file_version) VALUES (?, ?, ?)", [self._table_id, file['path'], file['file_version']])
-            db.commit()
+            self._sync_remote_metadata(db)
 
         # Fetch remote file metadata
         path = path.strip("/")
-        path_like = "%s/%%" % path
+        # Everything under path/ sorts between "path/" and "path0" ("0" follows "/"). Unlike LIKE, this range can
+        # use the (table_id, path) primary key index, and doesn't treat "_" and "%" in paths as wildcards.
+        folder_start, folder_end = path + "/", path + "0"
 
-        cur.execute("SELECT * FROM remote_files WHERE table_id = ? AND (path LIKE ? or path = ?) ORDER BY path = ?", [self._table_id, path_like, path, path])
+        # Download locks are taken in path order, so two processes fetching overlapping folders can't deadlock
+        cur.execute("SELECT * FROM remote_files WHERE table_id = ? AND ((path >= ? AND path < ?) OR path = ?) ORDER BY path = ?, path", [self._table_id, folder_start, folder_end, path, path])
         remote_files_metadata = cur.fetchall()
 
         if not remote_files_metadata:
@@ -153,73 +421,88 @@ class Files(object):
         else:
             # We might have matched multiple remote files (if path is a directory)
             is_folder = len(remote_files_metadata) > 1
-            for remote_file_metadata in remote_files_metadata:
-                logger.debug("Loading file: %s" % remote_file_metadata['path'])
-                if is_folder and remote_file_metadata['path'] == path:
-                    logger.warning("Found file with same name as folder: %s" % path)
-                    continue
-
-                try:
-                    db.execute("INSERT OR FAIL INTO local_files (table_id, path, remote_file_version, status) VALUES (?,?,?,'DOWNLOADING')", [self._table_id, remote_file_metadata['path'], remote_file_metadata['file_version']])
-                    db.commit()
-                    # We managed to insert the metadata, which means it didn't already exist. Download the file.
-                    self.download(db, remote_file_metadata)
-
-                except sqlite3.IntegrityError:
-                    # The metadata exists, so fetch it.
-                    cur.execute("SELECT * FROM local_files WHERE table_id = ? AND path = ?", [self._table_id, remote_file_metadata['path']])
-                    local_file_metadata = cur.fetchone()
-
-                    if local_file_metadata['status'] == 'DOWNLOADING':
-                        logger.debug("File is already downloading")
-                        while time() - local_file_metadata['last_touched'] < DOWNLOAD_TIMEOUT:
-                            logger.debug("Waiting for download to finish")
-                            # We haven't been downloading long. Wait and see.
-                            sleep(0.5)
-                            cur.execute("SELECT * FROM local_files WHERE table_id = ? AND path = ?", [self._table_id, remote_file_metadata['path']])
-                            local_file_metadata = cur.fetchone()
-                            if local_file_metadata['status'] == 'PRESENT':
-                                logger.debug("Download finished elsewhere")
-                                break
-                        else:
-                            # The download has probably stalled. Try again.
-                            logger.debug("Previous download timed out")
-                            self.download(db, remote_file_metadata)
-
-                    elif local_file_metadata['status'] == 'UPLOADING':
-                        logger.debug("Already uploading")
-                        # TODO: Something?
-                    elif local_file_metadata['status'] == 'PRESENT':
-                        if local_file_metadata['local_file_version'] == remote_file_metadata['file_version']:
-                            logger.debug("Found local cache")
-                        else:
-                            logger.debug("Local file cache has invalid hash.")
-                            self.download(db, remote_file_metadata)
-
-                    else:
-                        raise Exception("Invalid local file status: %s" % local_file_metadata['status'])
-
-            logger.debug("")
-            logger.debug("TABLES")
-            cur.execute("SELECT * FROM tables")
-            for r in cur.fetchall():
-                logger.debug(dict(r))
-            logger.debug("REMOTE FILES")
-            cur.execute("SELECT * FROM remote_files")
-            for r in cur.fetchall():
-                logger.debug(dict(r))
-
-            logger.debug("LOCAL FILES")
-            cur.execute("SELECT * FROM local_files")
-            for r in cur.fetchall():
-                logger.debug(dict(r))
-            logger.debug("")
+            # We hold each file's download lock from before we look at (or mark) its status until it is present.
+            # Other processes block on the lock rather than polling, and don't download the file a second time.
+            # A file that's DOWNLOADING while we hold its lock was abandoned by a process that died.
+            with ExitStack() as download_locks:
+                to_download = []
+                for remote_file_metadata in remote_files_metadata:
+                    logger.debug("Loading file: %s" % remote_file_metadata['path'])
+                    if is_folder and remote_file_metadata['path'] == path:
+                        logger.warning("Found file with same name as folder: %s" % path)
+                        continue
+
+                    file_lock = ExitStack()
+                    file_lock.enter_context(self._lock(remote_file_metadata['path'], "download", exclusive=True))
+                    with file_lock:
+                        if self._needs_download(db, cur, remote_file_metadata):
+                            # Keep the lock until it's downloaded
+                            download_locks.enter_context(file_lock.pop_all())
+                            to_download.append(remote_file_metadata)
+
+                self._download_all(to_download)
+
+            if to_download:
+                self._evict(db, keep=path)
+
+            if logger.isEnabledFor(logging.DEBUG):
+                self._log_db_state(cur)
 
             return local_path
+
+    def _needs_download(self, db, cur, remote_file_metadata):
+        # Called with the file's download lock held
+        try:
+            db.execute("INSERT OR FAIL INTO local_files (table_id, path, remote_file_version, status, last_touched) VALUES (?,?,?,'DOWNLOADING',?)", [self._table_id, remote_file_metadata['path'], remote_file_metadata['file_version'], time()])
+            db.commit()
+            # We managed to insert the metadata, which means it didn't already exist. Download the file,
+            # unless a copy with the right content hash is already on disk.
+            if self._revalidate(db, remote_file_metadata):
+                logger.debug("Found matching file on disk")
+                return False
+            return True
+
+        except sqlite3.IntegrityError:
+            # The metadata exists, so fetch it.
+            cur.execute("SELECT * FROM local_files WHERE table_id = ? AND path = ?", [self._table_id, remote_file_metadata['path']])
+            local_file_metadata = cur.fetchone()
+
+            if local_file_metadata['status'] == 'DOWNLOADING':
+                if fcntl is not None:
+                    logger.debug("Previous download was abandoned")
+                    return True
+                logger.debug("File is already downloading")
+                local_file_metadata = self._wait_for_download(cur, remote_file_metadata['path'])
+                if local_file_metadata is not None and local_file_metadata['status'] == 'PRESENT':
+                    logger.debug("Download finished elsewhere")
+                    return False
+                # The download has probably stalled. Try again.
+                logger.debug("Previous download timed out")
+                return True
+
+            elif local_file_metadata['status'] == 'UPLOADING':
+                logger.debug("Already uploading")
+                # TODO: Something?
+                return False
+            elif local_file_metadata['status'] == 'PRESENT':
+                if local_file_metadata['local_file_version'] == remote_file_metadata['file_version']:
+                    logger.debug("Found local cache")
+                    cur.execute("UPDATE local_files SET last_touched = ? WHERE table_id = ? AND path = ?", [time(), self._table_id, remote_file_metadata['path']])
+                    db.commit()
+                    return False
+                logger.debug("Local file cache has invalid hash.")
+                if self._revalidate(db, remote_file_metadata):
+                    logger.debug("Local file contents match remote hash")
+                    return False
+                return True
+
+            else:
+                raise Exception("Invalid local file status: %s" % local_file_metadata['status'])
     
     #!defMethod(anvil.files.EditingContextManager instance, path)!2: "Edit a file. To ensure the proper acquisition and release of the file, use the `editing`` function in a `with` statement e.g. `with data_files.editing('test.txt') as file:`" ["editing"]
     def editing(self, path):
-        local_path = self[path]
+        pinned = self.pinned(path)
+        local_path = pinned.__enter__()
         db = self._get_db()
         table_id = self._table_id
         upload = self.upload
@@ -229,17 +512,29 @@ class Files(object):
                 return local_path
 
             def __exit__(self, exc_type, exc_val, exc_tb):
-                upload(db, path)
+                try:
+                    upload(db, path)
+                finally:
+                    pinned.__exit__(None, None, None)
 
         return Editing()
 
     #!defMethod(anvil.files.OpenContextManager instance, path, [mode="r"])!2: "The open() function opens the file (if possible) and returns the corresponding file object." ["open"]
     @contextmanager
     def open(self, path, mode='r'):
-        with open(data_files[path], mode) as f:
-            yield f
-        if "w" in mode or "a" in mode or "+" in mode or "x" in mode:
-            self.upload(self._get_db(), path)
+        with self.pinned(path) as local_path:
+            with open(local_path, mode) as f:
+                yield f
+            if "w" in mode or "a" in mode or "+" in mode or "x" in mode:
+                self.upload(self._get_db(), path)
+
+    #!defMethod(anvil.files.PinnedContextManager instance, path)!2: "Keep a file (or folder) in the local cache while you use it. Use the `pinned` function in a `with` statement e.g. `with data_files.pinned('test.txt') as local_path:`" ["pinned"]
+    @contextmanager
+    def pinned(self, path):
+        path = path.strip("/")
+        # Hold the pin lock before fetching, so the file can't be evicted between fetching and use
+        with self._lock(path, "pin"):
+            yield self[path]
 
 #!defClass(anvil.files,%Files)!:
 
@@ -251,5 +546,9 @@ class Files(object):
 #!defMethod(_)!2: "Close the file, uploading its contents if it was opened for writing or appending." ["__exit__"]
 #!defClassNoConstructor(anvil.files,#%OpenContextManager)!1: "<a href='https://docs.python.org/3/library/contextlib.html#contextlib.contextmanager' target='_blank'>Context manager</a> for opening data files."
 
+#!defMethod(string)!2: "Pin the file, returning its local path." ["__enter__"]
+#!defMethod(_)!2: "Unpin the file." ["__exit__"]
+#!defClassNoConstructor(anvil.files,#%PinnedContextManager)!1: "<a href='https://docs.python.org/3/library/contextlib.html#contextlib.contextmanager' target='_blank'>Context manager</a> for keeping data files in the local cache while they are in use."
+
 #!defModuleAttr(anvil.files)!1: {name: "data_files", pyType: "anvil.files.Files instance", description: "Access Data Files from the <a href='https://docs.python.org/3/library/contextlib.html#contextlib.contextmanager' target='_blank'>Data Files Service</a>. To access a file stored in the Data Files Service use square brackets containing the path of the desired file - `data_files['<file_path>']`."}
 data_files = Files()
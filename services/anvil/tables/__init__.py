@@ -108,6 +108,8 @@ class _LazyContext(_ThreadLocal):
 
         from .v2 import _batcher as _b
 
+        # writes implicitly batched by the original batchers would otherwise be lost
+        _b.flush()
         for orig, obj in batchers.items():
             obj.__class__ = type(getattr(_b, orig))
             obj.__init__()
@@ -166,30 +168,106 @@ def get_table_by_id(table_id):
 #
 
 
+#!defFunction(anvil.tables,_,rows,*query_expressions,**column_values)!2:
+# {
+# 	$doc: "Filter and sort a list of rows (or a SearchIterator) using the same arguments as search(), without a call to the server. full_text_match() is not supported.",
+# anvil$helpLink: "/docs/data-tables/accelerated-tables"
+#  } ["local_search"]
+def local_search(rows, *args, **kws):
+    if _config.get_client_config().get("enable_v2"):
+        from .v2._local_query import local_search
+
+        return local_search(list(rows), *args, **kws)
+    raise TableError("local_search is only available in Accelerated Tables beta")
+
+
+#!defFunction(anvil.tables,%,[enabled=True])!2:
+# {
+# 	$doc: "Batch row updates and deletes for the rest of the current server call or background task. Batched writes are sent before any read that could observe them, before calls to other server functions (including launching background tasks), at transaction boundaries, and when the call returns.",
+# anvil$helpLink: "/docs/data-tables/accelerated-tables"
+#  } ["auto_batch"]
+def auto_batch(enabled=True):
+    if not anvil.is_server_side():
+        raise RuntimeError("auto_batch() is only available in server code")
+    if not _config.get_client_config().get("enable_v2"):
+        raise TableError("auto_batch is only available in Accelerated Tables beta")
+
+    from .v2 import _batcher
+
+    _batcher.set_auto_batch(enabled)
+
+
+def _flush_auto_batch(discard=False):
+    if _config.get_client_config().get("enable_v2"):
+        from .v2 import _batcher
+
+        _batcher.flush_auto(discard)
+
+
+def _current_span():
+    try:
+        from anvil_downlink_util.tracing import trace
+    except ImportError:
+        return None
+    return trace.get_current_span()
+
+
 class Transaction:
     def __init__(self, relaxed=False):
         self._aborting = False
         self._isolation = "relaxed" if relaxed else None
+        self.conflicts = 0
+        self.backoff_time = 0.0
 
     #!defMethod(anvil.tables.Transaction instance)!2: "Begin the transaction" ["__enter__"]
     def __enter__(self):
-        anvil.server.call(
-            "anvil.private.tables.open_transaction", isolation=self._isolation
-        )
+        _flush_auto_batch()
+        if _config.get_client_config().get("enable_v2"):
+            from .v2 import _batcher
+
+            # The transaction is opened by the first server call inside it: with that call, if it's a
+            # tables call, or with a separate open_transaction call just before it otherwise
+            _batcher.begin_transaction(self._isolation)
+        else:
+            anvil.server.call(
+                "anvil.private.tables.open_transaction", isolation=self._isolation
+            )
         return self
 
     #!defMethod(_)!2: "End the transaction" ["__exit__"]
     def __exit__(self, e_type, e_val, tb):
-        anvil.server.call(
-            "anvil.private.tables.close_transaction",
-            self._aborting or e_val is not None,
-        )
+        aborting = self._aborting or e_val is not None
+        if _config.get_client_config().get("enable_v2"):
+            from .v2 import _batcher
+
+            # Commits with the last batched write, if there is one
+            _batcher.end_transaction(aborting)
+        else:
+            anvil.server.call("anvil.private.tables.close_transaction", aborting)
 
     #!defMethod(_)!2: "Abort this transaction. When it ends, all write operations performed during it will be cancelled" ["abort"]
     def abort(self):
         self._aborting = True
 
-
+    def _record_conflict(self, backoff):
+        self.conflicts += 1
+        self.backoff_time += backoff
+        span = _current_span()
+        if span is not None:
+            span.add_event(
+                "anvil.tables.transaction_conflict",
+                {"attempt": self.conflicts, "backoff": backoff},
+            )
+            span.set_attributes(
+                {
+                    "anvil.tables.transaction.conflicts": self.conflicts,
+                    "anvil.tables.transaction.backoff_time": self.backoff_time,
+                }
+            )
+
+
+#!defAttr()!1: {name: "conflicts", type: "number", description: "The number of times in_transaction() has retried this transaction after a conflict"}
+#!defAttr()!1: {name: "backoff_time", type: "number", description: "The total number of seconds in_transaction() has waited before retrying this transaction"}
 #!defClass(anvil.tables,%Transaction)!:
 
 
@@ -206,9 +284,11 @@ def in_transaction(maybe_f=None, relaxed=None):
         @functools.wraps(f)
         def new_f(*args, **kwargs):
             n = 0
+            txn = Transaction(relaxed=relaxed)
             while True:
                 try:
-                    with Transaction(relaxed=relaxed):
+                    txn._aborting = False
+                    with txn:
                         return f(*args, **kwargs)
                 except TransactionConflict:
                     # lazy load random incase we make random.js a slow path on the client
@@ -220,6 +300,7 @@ def in_transaction(maybe_f=None, relaxed=None):
                     # print(f"RETRYING TXN {n}")
                     # Max total sleep time is a little under 150 seconds (avg 75), so server calls will timeout before this finishes usually.
                     sleep_amt = random.random() * (1.5**n) * 0.05
+                    txn._record_conflict(sleep_amt)
                     try:
                         time.sleep(sleep_amt)
                     except:
@@ -269,15 +350,18 @@ def get_connection_string(via_host=None, via_port=None):
 #!defMethod(client writable view)!2: "Return a view on the table that can be written by client code. Use keyword arguments to specify view restrictions. This does not give the client write access to other tables referred to by the table." ["client_writable"]
 #!defMethod(client writable view)!2: "Return a view on this table that can be written by client code. Use keyword arguments to specify view restrictions." ["client_writable_cascade"]
 #!defMethod(_)!2: "Delete all the rows from the data table" ["delete_all_rows"]
+#!defMethod(_, [frozen=True])!2: "Return read-only lists and dicts from Simple Object columns of this table instead of a fresh copy on every read. Call .copy() on a value to get a mutable copy." ["set_frozen_values"]
 #!defMethod(_)!2: "Get a single matching row from the data table whose columns match the keyword arguments. Returns None if no matching row exists, and raises an exception if more than one row matches.\n\nEg: app_tables.table_1.get(name='John Smith')" ["get"]
 #!defMethod(row,id)!2: "Get the matching row from this data table, by its unique ID" ["get_by_id"]
 #!defMethod(bool,row)!2: "Returns true if the table (or view) contains the provided row." ["has_row"]
 #!defMethod(list of dicts)!2: "Get the spec for the table as a list of dicts. Each dict contains the name and type of a column." ["list_columns"]
 #!defMethod(Row or None)!2: "Get rows from a data table. If you specify keyword arguments, you will retrieve only rows whose columns match those values.\n\nEg: app_tables.table_1.search(name='John Smith')" ["search"]
-#!defMethod(Media object, [escape_for_excel=False])!2: "Get the table in CSV format, optionally escaped for use in Excel. Returns a downloadable Media object; use its url property." ["to_csv"]
+#!defMethod(Media object, [escape_for_excel=False], [columns=None], [gzip=False])!2: "Get the table in CSV format, optionally escaped for use in Excel. Pass a list of column names to export only those columns, and gzip=True to compress the export. Returns a downloadable Media object; use its url property. In server code, anvil.media.open() reads the export without loading it all into memory." ["to_csv"]
 #!defClassNoConstructor(anvil.tables,#Table)!1: "A table returned from app_tables"
 
-#!defMethod(Media object, [escape_for_excel=False])!2: "Get the results of the SearchIterator in CSV format, optionally escaped for use in Excel. Returns a downloadable Media object; use its url property." ["to_csv"]
+#!defMethod(Media object, [escape_for_excel=False], [columns=None], [gzip=False])!2: "Get the results of the SearchIterator in CSV format, optionally escaped for use in Excel. Pass a list of column names to export only those columns, and gzip=True to compress the export. Returns a downloadable Media object; use its url property." ["to_csv"]
+#!defMethod(list of rows)!2: "Load every remaining page of results, using as few server calls as possible, and return the rows as a list. Afterwards iterating, indexing and len() need no further server calls." ["fetch_all"]
+#!defMethod(list of rows)!2: "Load every remaining page of results and return the rows as a list. Equivalent to fetch_all()." ["to_list"]
 #!defClassNoConstructor(anvil.tables,#SearchIterator)!1: "An iterator of table rows returned from a search()";
 
 
@@ -1,6 +1,7 @@
 import anvil
 import anvil.server
 
+from .._errors import TableError
 from ._constants import NOT_FOUND, SERVER_PREFIX
 from ._utils import ThreadLocal
 
@@ -8,6 +9,28 @@ PREFIX = SERVER_PREFIX + "row."
 _make_refs = None  # Circular import
 
 
+class _AutoBatch(ThreadLocal):
+    # When enabled, writes are batched for the rest of the current server call and flushed before
+    # any read, transaction boundary, call to other server code, or the end of the call
+    def __init__(self):
+        self.enabled = False
+
+
+_auto = _AutoBatch()
+
+
+class _Transaction(ThreadLocal):
+    # Transaction.__enter__ doesn't call the server.
+    # The open is sent with the next tables call, and the commit with the last flush
+    def __init__(self):
+        self.isolation = None  # waiting to be opened
+        self.open = False
+        self.unconfirmed = False  # the call that opened it failed
+
+
+_txn = _Transaction()
+
+
 class _Batcher(ThreadLocal):
     _name = ""
     _instance = None
@@ -25,19 +48,19 @@ class _Batcher(ThreadLocal):
 
     @property
     def active(self):
-        return self._active > 0
+        return self._active > 0 or _auto.enabled
 
     def push(self, *args):
         self._args.append(args)
 
-    def flush(self):
+    def flush(self, **kws):
         if not self.active:
             return
         args = self._args
         if not args:
             return
         try:
-            rv = anvil.server.call(self._func, args)
+            rv = call(self._func, args, **kws)
             self.post_flush(args, rv)
         finally:
             self.reset()
@@ -50,6 +73,10 @@ class _Batcher(ThreadLocal):
         raise NotImplementedError
 
     def __enter__(self):
+        if self._active == 0 and _auto.enabled:
+            # Implicitly batched writes are not part of this block
+            # so they must not be discarded if the block fails
+            self.flush()
         self._active += 1
 
     def __exit__(self, exc_type, exc_value, traceback):
@@ -67,6 +94,14 @@ class _Batcher(ThreadLocal):
 class BatchUpdate(_Batcher):
     _name = "batch_update"
 
+    def __init__(self):
+        _Batcher.__init__(self)
+        self._last = {}
+
+    def reset(self):
+        _Batcher.reset(self)
+        self._last.clear()
+
     def push(self, cap, update, on_behalf_of_client):
         global _make_refs
         if _make_refs is None:
@@ -74,7 +109,16 @@ class BatchUpdate(_Batcher):
 
             _make_refs = make_refs
 
-        self._args.append((cap, _make_refs(update), on_behalf_of_client))
+        refs = _make_refs(update)
+        last = self._last.get(cap)
+        if last is not None and last[2] == on_behalf_of_client:
+            # Coalesce with the most recent update for this cap
+            # Only the latest entry is safe: an update with other overrides may have come since
+            last[1].update(refs)
+        else:
+            last = (cap, dict(refs), on_behalf_of_client)
+            self._args.append(last)
+            self._last[cap] = last
         self._buffer.setdefault(cap, {}).update(update)
 
     def get_updates(self, cap):
@@ -99,6 +143,12 @@ class BatchUpdate(_Batcher):
 class BatchDelete(_Batcher):
     _name = "batch_delete_2"
 
+    def push(self, cap, on_behalf_of_client):
+        if cap in self._buffer:
+            return  # already queued for deletion
+        self._buffer[cap] = True
+        self._args.append((cap, on_behalf_of_client))
+
     def post_flush(self, args, result):
         from ._row import _send_cap_update
 
@@ -115,9 +165,123 @@ def flush():
     batch_delete.flush()
 
 
+def call(fn, *args, **kws):
+    if _txn.isolation is None:
+        return anvil.server.call(fn, *args, **kws)
+    kws["_open_transaction"] = _txn.isolation
+    _txn.isolation = None
+    _txn.open = _txn.unconfirmed = True
+    rv = anvil.server.call(fn, *args, **kws)
+    _txn.unconfirmed = False
+    return rv
+
+
 def flush_and_call(fn, *args, **kws):
     flush()
-    return anvil.server.call(fn, *args, **kws)
+    return call(fn, *args, **kws)
+
+
+def _before_other_calls(fn_name):
+    # Other server code (eg another server function, or a background task) must see our batched writes.
+    # Tables calls send them when they need to, and flushing here would recurse into flush().
+    if not fn_name.startswith("anvil.private.tables."):
+        flush_auto()
+    _open_before_other_calls()
+
+
+def _open_before_other_calls():
+    # Tables calls open a pending transaction themselves (see call()), clearing _txn.isolation first.
+    # Any other server call (eg get_user(), or another server function) must run inside the transaction,
+    # so open it now.
+    if _txn.isolation is None:
+        return
+    isolation = _txn.isolation
+    _txn.isolation = None
+    anvil.server.call("anvil.private.tables.open_transaction", isolation=isolation)
+    _txn.open = True
+
+
+def begin_transaction(isolation):
+    if _txn.isolation is not None or _txn.open:
+        raise TableError("You already have a transaction open here")
+    _txn.isolation = isolation or "serializable"
+
+
+def end_transaction(aborting):
+    try:
+        if aborting:
+            # writes batched inside an aborted transaction would be rolled back anyway
+            flush_auto(discard=True)
+        elif _auto.enabled:
+            pending = [b for b in (batch_update, batch_delete) if b._args]
+            for batcher in pending[:-1]:
+                batcher.flush()
+            if pending:
+                # The server closes the transaction with this call (even if the call also opens it),
+                # committing it or, if the call fails, rolling it back. So we mustn't close it again.
+                try:
+                    pending[-1].flush(_close_transaction=True)
+                finally:
+                    _txn.open = _txn.unconfirmed = False
+    except:
+        aborting = True
+        raise
+    finally:
+        # If nothing was sent to the server there's nothing to close
+        _txn.isolation = None
+        if _txn.open:
+            _txn.open = False
+            try:
+                anvil.server.call("anvil.private.tables.close_transaction", aborting)
+            except Exception:
+                # we can't tell whether the open failed, so don't mask the original error
+                if not (aborting and _txn.unconfirmed):
+                    raise
+            finally:
+                _txn.unconfirmed = False
+
+
+def set_auto_batch(enabled):
+    if not enabled:
+        flush()
+    _auto.enabled = bool(enabled)
+
+
+def flush_auto(discard=False):
+    # Implicitly batched writes must not cross a transaction boundary
+    if not _auto.enabled:
+        return
+    if discard:
+        batch_update.reset()
+        batch_delete.reset()
+    else:
+        flush()
+
+
+def _flush_at_call_complete():
+    try:
+        if _txn.isolation is not None or _txn.open:
+            # This call never ended its transaction (eg the Transaction's __exit__ didn't run), so roll it back,
+            # along with any writes batched inside it
+            batch_update.reset()
+            batch_delete.reset()
+            if _txn.open:
+                try:
+                    anvil.server.call("anvil.private.tables.close_transaction", True)
+                except Exception:
+                    pass
+        else:
+            flush()
+    finally:
+        # Nothing carries over to the next call on this thread
+        _auto.enabled = False
+        _txn.isolation = None
+        _txn.open = _txn.unconfirmed = False
+
+
+if anvil.is_server_side():
+    anvil.server._on_call_complete(_flush_at_call_complete)
+    anvil.server._on_outbound_call(_before_other_calls)
 
 
 class CombinedBatch(ThreadLocal):
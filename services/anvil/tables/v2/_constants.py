@@ -13,6 +13,7 @@ SINGLE = "link_single"
 MULTIPLE = "link_multiple"
 DATETIME = "datetime"
 MEDIA = "media"
+SIMPLE_OBJECT = "simpleObject"
 
 SHARED_DATA_KEY = "anvil.tables"
 
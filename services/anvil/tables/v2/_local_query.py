@@ -0,0 +1,280 @@
+import datetime
+
+import anvil.tz
+from anvil.server import Capability, unwrap_capability
+
+from .. import query as q
+from .._errors import TableError
+from ._constants import DATETIME, MULTIPLE, NOT_FOUND, SINGLE
+from ._refs import RowRef
+from ._row import Row
+from ._utils import clean_local_datetime
+
+# Evaluate anvil.tables.query expressions against rows we already have locally.
+# The semantics follow the server's SQL generation (see query.clj):
+#  - col=None matches NULL, any other equality never matches NULL
+#  - Simple Object equality is jsonb containment (@>)
+#  - link_multiple equality matches rows linking to *all* of the given rows
+#  - inequalities and like/ilike never match NULL
+#  - order_by sorts ASC NULLS FIRST / DESC NULLS LAST, with ties broken by row id
+# String ordering uses Python's code point order rather than the database collation.
+
+SIMPLE_OBJECT = "simpleObject"
+_INEQUALITIES = {
+    q.greater_than: lambda a, b: a > b,
+    q.greater_than_or_equal_to: lambda a, b: a >= b,
+    q.less_than: lambda a, b: a < b,
+    q.less_than_or_equal_to: lambda a, b: a <= b,
+}
+_IGNORED_ARGS = (q.page_size, q.fetch_only)
+
+
+def _row_key(val):
+    # Queries hold RowRefs (see make_refs) but may also hold Row objects
+    if isinstance(val, Row):
+        return (val._anvil.table_id, val._anvil.id)
+    if isinstance(val, RowRef):
+        _, _, view_dict, narrowed, _ = unwrap_capability(
+            val.cap, ["_", "t", Capability.ANY, Capability.ANY, Capability.ANY]
+        )
+        return (str(view_dict["id"]), str(narrowed["r"]))
+    return NOT_FOUND
+
+
+def _col_type(row, col_name):
+    spec = row._anvil.spec
+    if spec is None:
+        return None
+    for col in spec["cols"]:
+        if col["name"] == col_name:
+            return col["type"]
+    return None
+
+
+def _json_contains(target, pattern, top_level=True):
+    # Postgres jsonb @> semantics
+    if isinstance(pattern, dict):
+        if not isinstance(target, dict):
+            return False
+        return all(
+            key in target and _json_contains(target[key], val, False)
+            for key, val in pattern.items()
+        )
+    if isinstance(pattern, list):
+        if not isinstance(target, list):
+            return False
+        return all(any(_json_contains(t, p, False) for t in target) for p in pattern)
+    if isinstance(target, list):
+        # only a top level array can contain a primitive
+        return top_level and any(_json_contains(t, pattern, False) for t in target)
+    if isinstance(target, dict):
+        return False
+    if isinstance(target, bool) or isinstance(pattern, bool):
+        return type(target) is type(pattern) and target == pattern
+    return target == pattern
+
+
+def _clean_query_datetime(val):
+    if isinstance(val, datetime.datetime) and val.tzinfo is None:
+        return clean_local_datetime(val)
+    return val
+
+
+def _equals(col_type, val, expected):
+    if expected is None:
+        return val is None
+    if val is None:
+        return False
+
+    expected_key = _row_key(expected)
+    if col_type == MULTIPLE or (col_type is None and isinstance(expected, (list, tuple))
+                                and expected and _row_key(expected[0]) is not NOT_FOUND):
+        linked = set(_row_key(row) for row in val)
+        return all(_row_key(row) in linked for row in expected)
+    if col_type == SINGLE or expected_key is not NOT_FOUND:
+        return _row_key(val) == expected_key
+    if col_type == SIMPLE_OBJECT or (col_type is None and isinstance(val, (dict, list))):
+        return _json_contains(val, expected)
+    if col_type == DATETIME:
+        return val == _clean_query_datetime(expected)
+    return val == expected
+
+
+def _compare(col_type, val, expected, op):
+    if val is None:
+        return False
+    expected = _clean_query_datetime(expected)
+    val_is_dt = isinstance(val, datetime.datetime)
+    expected_is_dt = isinstance(expected, datetime.datetime)
+    if val_is_dt and not expected_is_dt and isinstance(expected, datetime.date):
+        # datetime column compared with a date: use the UTC date
+        val = val.astimezone(anvil.tz.UTC).date()
+    elif expected_is_dt and not val_is_dt and isinstance(val, datetime.date):
+        # date column compared with a datetime: midnight UTC on that date
+        val = datetime.datetime(val.year, val.month, val.day, tzinfo=anvil.tz.UTC)
+    try:
+        return op(val, expected)
+    except TypeError:
+        raise TableError(
+            "Invalid query: Cannot compare {} with {}".format(
+                type(val).__name__, type(expected).__name__
+            )
+        )
+
+
+def _like_matcher(pattern, ignore_case):
+    import re
+
+    regex = []
+    chars = iter(pattern)
+    for c in chars:
+        if c == "\\":
+            regex.append(re.escape(next(chars, "\\")))
+        elif c == "%":
+            regex.append(".*")
+        elif c == "_":
+            regex.append(".")
+        else:
+            regex.append(re.escape(c))
+    flags = re.DOTALL | (re.IGNORECASE if ignore_case else 0)
+    return re.compile("^" + "".join(regex) + "$", flags)
+
+
+def _value_matcher(col_name, expected):
+    # Returns a function (row) -> bool for a single column constraint
+    expected_type = type(expected)
+
+    if expected_type in _INEQUALITIES:
+        op, value = _INEQUALITIES[expected_type], expected.value
+
+        def match(row):
+            return _compare(_col_type(row, col_name), row[col_name], value, op)
+
+    elif expected_type in (q.like, q.ilike):
+        if not isinstance(expected.pattern, str):
+            raise TableError("Invalid query: Argument to the 'like' operator must be a string.")
+        regex = _like_matcher(expected.pattern, expected_type is q.ilike)
+
+        def match(row):
+            val = row[col_name]
+            if val is None:
+                return False
+            if not isinstance(val, str):
+                raise TableError(
+                    "Invalid query: Cannot use 'like' operator on column '{}'".format(col_name)
+                )
+            return regex.match(val) is not None
+
+    elif expected_type is q.full_text_match:
+        raise TableError("full_text_match() queries cannot be evaluated locally")
+
+    elif expected_type in (q.all_of, q.any_of, q.none_of):
+        if expected.kwargs:
+            raise TableError(
+                "Cannot specify keyword arguments when limiting column values with {}()".format(
+                    expected_type.__name__
+                )
+            )
+        terms = [_value_matcher(col_name, arg) for arg in expected.args]
+        return _combine(expected_type, terms)
+
+    else:
+
+        def match(row):
+            return _equals(_col_type(row, col_name), row[col_name], expected)
+
+    return match
+
+
+def _combine(query_type, terms):
+    if query_type is q.all_of:
+        return lambda row: all(term(row) for term in terms)
+    elif query_type is q.any_of:
+        return lambda row: any(term(row) for term in terms)
+    return lambda row: not any(term(row) for term in terms)
+
+
+def _query_matcher(query_type, args, kws):
+    terms = []
+    for arg in args:
+        if type(arg) not in (q.all_of, q.any_of, q.none_of):
+            raise TypeError("Invalid query argument: {!r}".format(arg))
+        terms.append(_query_matcher(type(arg), arg.args, arg.kwargs))
+    for col_name, expected in kws.items():
+        terms.append(_value_matcher(col_name, expected))
+    return _combine(query_type, terms)
+
+
+def _row_id(row):
+    try:
+        return int(row._anvil.id)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _sort_rows(rows, order_by):
+    rows.sort(key=_row_id)
+    # Successive stable sorts, least significant column first
+    for ordering in reversed(order_by):
+        col_name = ordering.column_name
+
+        def key(row):
+            val = row[col_name]
+            if val is None:
+                return (0,)
+            if isinstance(val, Row):
+                return (1, _row_id(val))
+            if isinstance(val, (dict, list)):
+                raise TableError("Cannot order by column '{}'".format(col_name))
+            return (1, val)
+
+        # NULLS FIRST when ascending, NULLS LAST when descending
+        rows.sort(key=key, reverse=not ordering.ascending)
+
+
+def local_search(rows, *args, **kws):
+    from .. import order_by
+
+    order_bys = []
+    query_args = []
+    for arg in args:
+        if isinstance(arg, order_by):
+            order_bys.append(arg)
+        elif not isinstance(arg, _IGNORED_ARGS):
+            query_args.append(arg)
+
+    match = _query_matcher(q.all_of, query_args, kws)
+    matched = [row for row in rows if match(row)]
+    if order_bys:
+        _sort_rows(matched, order_bys)
+    return LocalSearchIterator(matched)
+
+
+class LocalSearchIterator(object):
+    """The results of a search evaluated without a server call"""
+
+    def __init__(self, rows):
+        self._rows = rows
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __bool__(self):
+        # consistent with SearchIterator
+        return True
+
+    __nonzero__ = __bool__
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LocalSearchIterator(self._rows[idx])
+        return self._rows[idx]
+
+    def __repr__(self):
+        return "<anvil.tables.LocalSearchIterator object>"
+
+    def local_search(self, *args, **kws):
+        return local_search(self._rows, *args, **kws)
@@ -115,6 +115,7 @@ def get_base_model_cls(table_id):
             cls,
             attrs=False,
             buffered=False,
+            frozen_values=False,
             client_writable=False,
             client_updatable=NOT_FOUND,
             client_creatable=NOT_FOUND,
@@ -143,6 +144,9 @@ def get_base_model_cls(table_id):
             if buffered:
                 cls._Row_buffered_ = True
 
+            if frozen_values:
+                cls._Row_frozen_ = True
+
             row_permissions = {}
 
             for perm_type, value in [
@@ -13,6 +13,7 @@ from ._constants import (
     NOT_FOUND,
     SERVER_PREFIX,
     SHARED_DATA_KEY,
+    SIMPLE_OBJECT,
     SINGLE,
     UNCACHED,
 )
@@ -59,6 +60,62 @@ def _copy(so):
     return so
 
 
+def _read_only(*args, **kws):
+    raise TypeError(
+        "Row values are read-only for this table. Use .copy() to get a mutable copy"
+    )
+
+
+class FrozenList(list):
+    """A read-only list returned from rows with frozen values"""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = sort = reverse = _read_only
+
+    def copy(self):
+        return _copy(self)
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return _copy(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+class FrozenDict(dict):
+    """A read-only dict returned from rows with frozen values"""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def copy(self):
+        return _copy(self)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _copy(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def _freeze(so):
+    if type(so) is FrozenList or type(so) is FrozenDict:
+        return so
+    if isinstance(so, list):
+        return FrozenList([_freeze(o) for o in so])
+    if isinstance(so, dict):
+        return FrozenDict({k: _freeze(v) for k, v in so.items()})
+    return so
+
+
 def _new_save_plan():
     """Return the shared save/reset plan structure.
 
@@ -204,6 +261,7 @@ class Row(BaseRow):
     __slots__ = ("_anvil",)
     _Row_prefix_ = "anvil.tables.Row"
     _Row_buffered_ = False
+    _Row_frozen_ = False
     _Row_permissions_ = {"update": False, "create": False, "delete": False}
 
     @classmethod
@@ -224,6 +282,7 @@ class Row(BaseRow):
         self._anvil.cap = cap
         self._anvil.queued_cap_updates = {}
         self._anvil.cache = {}
+        self._anvil.packed = None  # (table_data, compact row_data) for lazy rows
         self._anvil.spec = (
             spec  # None when we are deserialized without access to table_data
         )
@@ -258,7 +317,7 @@ class Row(BaseRow):
         return row
 
     @classmethod
-    def _anvil_create_from_trusted(cls, view_key, table_id, row_id, table_data):
+    def _anvil_create_from_trusted(cls, view_key, table_id, row_id, table_data, lazy=False):
         table_id, row_id = str(table_id), str(row_id)
         view_data = table_data[view_key]
         rows = view_data["rows"]
@@ -271,6 +330,9 @@ class Row(BaseRow):
         # Replace the compact row_data with ourself
         # This prevents circular references and has the benefit that
         # we create the same rows and linked rows when creating Row objects from the same data
+        if lazy and type(row_data) is list and not view_data.get("dirty_spec"):
+            row._anvil_unpack_lazily(table_data, row_data)
+            return row
         row._anvil_unpack(table_data, row_data)
         if view_data.get("dirty_spec"):
             # a serialized row marked its spec as dirty after an update
@@ -307,6 +369,7 @@ class Row(BaseRow):
         return cls._anvil_create_from_trusted(view_key, table_id, row_id, table_data)
 
     def _anvil_unpack(self, table_data, row_data):
+        self._anvil_materialize()
         assert type(row_data) in (
             list,
             dict,
@@ -355,6 +418,55 @@ class Row(BaseRow):
             unpacked_cache[col["name"]] = val
         return unpacked_cache, next(iter_row_data)
 
+    def _anvil_unpack_lazily(self, table_data, row_data):
+        # Keep the shared compact row_data and only decode columns as they are read.
+        # The full cache is unpacked by _anvil_materialize() when we need all of it
+        # e.g. dict(row), iteration, serialization or cap updates
+        cap = row_data[-1]
+        assert type(cap) is Capability, "invalid row_data"
+        self._anvil.packed = (table_data, row_data)
+        self._anvil.has_uncached = not all(self._anvil.spec["cache"]) or any(
+            val is UNCACHED for val in row_data
+        )
+        self._anvil.cap = cap
+        cap.set_update_handler(
+            self._anvil_cap_update_handler, get_update=self._anvil_get_cap_update
+        )
+
+    def _anvil_unpack_col(self, key):
+        table_data, row_data = self._anvil.packed
+        spec = self._anvil.spec
+        i = 0
+        for col, is_cached in zip(spec["cols"], spec["cache"]):
+            if col["name"] != key:
+                i += 1 if is_cached else 0
+                continue
+            if is_cached:
+                val = self._anvil_maybe_unpack_linked(row_data[i], col, table_data)
+            else:
+                val = UNCACHED
+            self._anvil.cache[key] = val
+            return
+
+    def _anvil_materialize(self):
+        packed = self._anvil.packed
+        if packed is None:
+            return
+        self._anvil.packed = None
+        table_data, row_data = packed
+        spec = self._anvil.spec
+        # columns we've already decoded are decoded again to the same values
+        unpacked_cache, _ = self._anvil_unpack_compact(
+            table_data, spec, spec["cols"], row_data, True
+        )
+        self._anvil.cache.update(unpacked_cache)
+        self._anvil_check_has_cached()
+
+    def _anvil_has_key(self, key):
+        if self._anvil.packed is not None:
+            return any(col["name"] == key for col in self._anvil.spec["cols"])
+        return key in self.keys()
+
     def _anvil_unpack_dict(self, table_data, cols, row_data, initial_load):
         unpacked_cache = {}
         for i, col in enumerate(cols):
@@ -506,6 +618,7 @@ class Row(BaseRow):
     def _anvil_merge_and_reduce(self, g_table_data, local_data, remote_is_trusted):
         if check_serialized(self, local_data):
             return int(self._anvil.id)
+        self._anvil_materialize()
         g_view_data = init_view_data(self._anvil.view_key, g_table_data)
         row_id = self._anvil.id
 
@@ -572,6 +685,7 @@ class Row(BaseRow):
         if cap_update is None:
             return
 
+        self._anvil_materialize()
         self._anvil_queue_cap_update(cap_update)
 
         # queue the updates
@@ -618,11 +732,13 @@ class Row(BaseRow):
     def _anvil_clear_cache(self):
         # clearing the cache also clears the spec - this forces a call to the server to update a spec
         self._anvil.spec = None
+        self._anvil.packed = None
         self._anvil.cache.clear()
         self._anvil.cache_spec = []
         self._anvil.has_uncached = True
 
     def _anvil_fill_cache(self, fetch=None):
+        self._anvil_materialize()
         if fetch is not None:
             uncached_keys = None if fetch is True else fetch
         elif self._anvil.spec is None:
@@ -699,7 +815,7 @@ class Row(BaseRow):
         return RowIterator(self)
 
     def __contains__(self, key):
-        return key in self.keys()
+        return self._anvil_has_key(key)
 
     def __getitem__(self, key):
         if not isinstance(key, str):
@@ -719,6 +835,8 @@ class Row(BaseRow):
                 return _copy(rv)
         if self._anvil.spec is None:
             self._anvil_fill_cache()
+        if self._anvil.packed is not None and key not in self._anvil.cache:
+            self._anvil_unpack_col(key)
         hit = self._anvil.cache.get(key, NOT_FOUND)
         if hit is UNCACHED:
             # we have a spec now so we'll fetch the remaining columns
@@ -731,12 +849,35 @@ class Row(BaseRow):
                 # try to force fetch this key - incase we have a bad spec - i.e auto-columns
                 self._anvil_fill_cache([key])
         else:
-            return _copy(hit)
+            return self._anvil_read_cache(key)
         try:
-            return _copy(self._anvil.cache[key])
+            return self._anvil_read_cache(key)
         except KeyError:
             raise NoSuchColumnError("No such column '" + key + "'")
 
+    def _anvil_read_cache(self, key):
+        val = self._anvil.cache[key]
+        if not self._Row_frozen_:
+            return _copy(val)
+        if type(val) is FrozenList or type(val) is FrozenDict:
+            return val
+        if not isinstance(val, (list, dict)) or self._anvil_col_type(key) != SIMPLE_OBJECT:
+            # Only Simple Object values are frozen - e.g. link_multiple lists are still copied
+            return _copy(val)
+        # Freeze once and keep the frozen value in the cache
+        # so subsequent reads don't need to copy anything
+        frozen = _freeze(val)
+        if frozen is not val:
+            self._anvil.cache[key] = frozen
+        return frozen
+
+    def _anvil_col_type(self, key):
+        spec = self._anvil.spec
+        for col in spec["cols"] if spec is not None else ():
+            if col["name"] == key:
+                return col["type"]
+        return None
+
     def __setitem__(self, key, value):
         return self.update(**{key: value})
 
@@ -785,6 +926,7 @@ class Row(BaseRow):
         }
 
         # Find cols that are both cached and easily printed
+        self._anvil_materialize()
         cache, cols = self._anvil.cache, self._anvil.spec["cols"]
         cached_printable_cols = [
             (c["name"], printable_types[c["type"]], cache[c["name"]])
@@ -872,7 +1014,7 @@ class Row(BaseRow):
     #     return self._anvil.table_id
 
     def get(self, key, default=None):
-        if key in self.keys():
+        if self._anvil_has_key(key):
             return self[key]
         return default
 
@@ -883,6 +1025,7 @@ class Row(BaseRow):
             # if we don't have a _spec we don't have any keys
             # but we don't need to blindly call _fill_uncached: UNCACHED values are fine
             self._anvil_fill_cache([])
+        self._anvil_materialize()
         return self._anvil.cache.keys()
 
     def _anvil_get_view(self):
@@ -890,6 +1033,7 @@ class Row(BaseRow):
         if _is_buffered(self):
             fetch = [k for k in self.keys() if k not in self._anvil.buffer]
         self._anvil_fill_cache(fetch)
+        self._anvil_materialize()
 
         view = _copy(self._anvil.cache)
 
@@ -1092,6 +1236,7 @@ class Row(BaseRow):
 
 class RowIterator:
     def __init__(self, row):
+        row._anvil_materialize()
         self._row = row
         self._fill_required = row._anvil.spec is None and not _is_draft(row)
         if _is_draft(row):
@@ -1112,10 +1257,13 @@ class RowIterator:
         if _batcher.batch_update.active:
             batched = _batcher.batch_update.read(self._row._anvil.cap, key)
             if batched is not NOT_FOUND:
-                value = batched
+                return (key, _copy(batched))
+
+        if _is_draft(self._row):
+            return (key, _copy(value))
 
-        if not _is_draft(self._row) and key in self._row._anvil.buffer:
-            value = self._row._anvil.buffer[key]
+        if key in self._row._anvil.buffer:
+            return (key, _copy(self._row._anvil.buffer[key]))
 
         if value is UNCACHED:
             # fill the rest of the cache
@@ -1123,9 +1271,8 @@ class RowIterator:
             # we rely here on the _cache keys not changing during iteration
             # which works since we've filled it with UNCACHED values that match our expected keys
             self._row._anvil_fill_cache()
-            value = self._row._anvil.cache[key]
 
-        return (key, _copy(value))
+        return (key, self._row._anvil_read_cache(key))
 
     next = __next__
 
@@ -1318,6 +1465,7 @@ def _walk_buffered_changes(row, changes, drafts, buffered, seen):
         return
 
     # we don't need to worry about drafts in the cache
+    row._anvil_materialize()
     for val in row._anvil.cache.values():
         if isinstance(val, Row):
             _walk_buffered_changes(
@@ -9,6 +9,7 @@ from ._utils import (
     check_serialized,
     clean_row_data,
     clean_table_spec,
+    csv_kwargs,
     init_spec_rows,
     init_view_data,
     merge_row_data,
@@ -16,6 +17,8 @@ from ._utils import (
 )
 
 PREFIX = SERVER_PREFIX + "search."
+# Page size used when we know we want every remaining row
+FETCH_ALL_PAGE_SIZE = 1000
 
 
 class PartialSearchIter(object):
@@ -34,7 +37,7 @@ class PartialSearchIter(object):
         self._reset(row_ids, cap_next, s._table_data)
 
     def _reset(self, row_ids, cap_next, table_data):
-        if self._stop is not None and len(row_ids) > self._stop:
+        if self._stop is not None and len(row_ids) >= self._stop:
             row_ids, cap_next = row_ids[: self._stop], None
         self._row_ids = row_ids
         self._cap_next = cap_next
@@ -49,8 +52,20 @@ class PartialSearchIter(object):
         if self._stop is not None:
             self._stop -= num_row_ids
 
+        kws = {}
+        if self._idx > 0:
+            # jump straight to the row we want rather than paging through
+            kws["offset"] = self._idx
+            if self._stop is not None:
+                self._stop -= self._idx
+            self._idx = 0
+        if self._stop is not None:
+            if self._stop <= 0:
+                raise StopIteration
+            kws["page_size"] = min(self._stop, FETCH_ALL_PAGE_SIZE)
+
         row_ids, cap_next, table_data = _batcher.flush_and_call(
-            PREFIX + "next_page", self._cap_next
+            PREFIX + "next_page", self._cap_next, **kws
         )
 
         self._reset(row_ids, cap_next, table_data)
@@ -66,7 +81,7 @@ class PartialSearchIter(object):
             return self._iter_next_page()
         self._idx += self._step
         return Row._anvil_create_from_trusted(
-            self._view_key, self._table_id, row_id, self._table_data
+            self._view_key, self._table_id, row_id, self._table_data, lazy=True
         )
 
     next = __next__
@@ -85,6 +100,7 @@ class SearchIterator(BaseSearchIterator):
         self._cap_next = cap_next
         self._table_data = table_data
         self._from_serialize = False
+        self._length = None
         return self
 
     @classmethod
@@ -101,13 +117,21 @@ class SearchIterator(BaseSearchIterator):
         self._from_serialize = True
         return self
 
-    def _fill_data(self):
+    def _fill_data(self, **kws):
         self._row_ids, self._cap_next, self._table_data = _batcher.flush_and_call(
-            PREFIX + "next_page", self._cap
+            PREFIX + "next_page", self._cap, **kws
         )
 
     def _clear_cache(self):
-        self._row_ids = self._table_data = self._cap_next = None
+        self._row_ids = self._table_data = self._cap_next = self._length = None
+
+    def _create_rows(self, row_ids, table_data):
+        return [
+            Row._anvil_create_from_trusted(
+                self._view_key, self._table_id, row_id, table_data, lazy=True
+            )
+            for row_id in row_ids
+        ]
 
     # SERIALIZATION
     def _make_row_data(self, row_data, table_spec, compact=True):
@@ -203,7 +227,9 @@ class SearchIterator(BaseSearchIterator):
     def __len__(self):
         if self._cap_next is None and self._row_ids is not None:
             return len(self._row_ids)
-        return _batcher.flush_and_call(PREFIX + "get_length", self._cap)
+        if self._length is None:
+            self._length = _batcher.flush_and_call(PREFIX + "get_length", self._cap)
+        return self._length
 
     def __hash__(self):
         return hash((self._table_id, self._cap))
@@ -222,14 +248,50 @@ class SearchIterator(BaseSearchIterator):
     def refresh(self):
         self._clear_cache()
 
-    def to_csv(self, escape_for_excel=False):
+    def fetch_all(self):
+        # Load every remaining page, in as few requests as possible, and keep the rows
+        # so that later iteration, indexing and len() need no further server calls
+        if self._row_ids is None:
+            self._fill_data(page_size=FETCH_ALL_PAGE_SIZE)
+        rows = self._create_rows(self._row_ids, self._table_data)
+        if self._cap_next is None:
+            return rows
+
+        row_ids = list(self._row_ids)
+        view_data = self._table_data[self._view_key]
+        cap_next = self._cap_next
+        while cap_next is not None:
+            page_ids, cap_next, table_data = _batcher.flush_and_call(
+                PREFIX + "next_page", cap_next, page_size=FETCH_ALL_PAGE_SIZE
+            )
+            page = self._create_rows(page_ids, table_data)
+            # Rows already carry their spec and linked rows, so they can sit in our view_data
+            for row_id, row in zip(page_ids, page):
+                view_data["rows"][str(row_id)] = row
+            row_ids.extend(page_ids)
+            rows.extend(page)
+
+        self._row_ids, self._cap_next = row_ids, None
+        return rows
+
+    to_list = fetch_all
+
+    def to_csv(self, escape_for_excel=False, columns=None, gzip=False):
         return _batcher.flush_and_call(
-            PREFIX + "to_csv", self._cap, escape_for_excel=escape_for_excel
+            PREFIX + "to_csv", self._cap, **csv_kwargs(escape_for_excel, columns, gzip)
         )
 
+    def local_search(self, *args, **kws):
+        # Evaluate a further query against our rows without a server call
+        # (any remaining pages are fetched first)
+        from ._local_query import local_search
+
+        return local_search(self.fetch_all(), *args, **kws)
+
     def delete_all_rows(self):
         result = _batcher.flush_and_call(PREFIX + "delete_all", self._cap)
         self._clear_cache()
+        self._length = 0
         return result
 
     def __getitem__(self, idx):
@@ -242,7 +304,8 @@ class SearchIterator(BaseSearchIterator):
             )
             return self._make_partial_iterator(slice_)
         else:
-            slice_ = slice(as_idx(idx), None)
+            idx = as_idx(idx)
+            slice_ = slice(idx, idx + 1)
         try:
             return next(self._make_partial_iterator(slice_))
         except StopIteration:
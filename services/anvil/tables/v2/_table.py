@@ -7,7 +7,7 @@ from ._model import get_base_model_cls
 from ._refs import make_refs
 from ._row import Row
 from ._search import SearchIterator
-from ._utils import validate_cap
+from ._utils import csv_kwargs, validate_cap
 from . import _batcher
 
 PREFIX = SERVER_PREFIX + "table."
@@ -75,6 +75,10 @@ class Table(BaseTable):
     def client_writable_cascade(self, *args, **kws):
         return self._get_view(CASCADE, args, kws)
 
+    def set_frozen_values(self, frozen=True):
+        # Rows from this table return read-only lists and dicts rather than copying them on every read
+        self.Row._Row_frozen_ = bool(frozen)
+
     def delete_all_rows(self):
         return _batcher.flush_and_call(PREFIX + "delete_all_rows", self._cap)
 
@@ -86,7 +90,7 @@ class Table(BaseTable):
             row = dict(row)
             refs.append(make_refs(row))
             row_dicts.append(row)
-        row_id_caps, spec = anvil.server.call(PREFIX + "add_rows", self._cap, refs)
+        row_id_caps, spec = _batcher.call(PREFIX + "add_rows", self._cap, refs)
         return [
             self.Row._anvil_create_from_local_values(
                 self._view_key, self._id, row_id, spec, cap, row_items
@@ -98,7 +102,7 @@ class Table(BaseTable):
         return self._do_add_row(data)
 
     def _do_add_row(self, data, client_request_overrides=None, trusted_values=None):
-        row_id, cap, spec = anvil.server.call(
+        row_id, cap, spec = _batcher.call(
             PREFIX + "add_row",
             self._cap,
             make_refs(data),
@@ -145,9 +149,9 @@ class Table(BaseTable):
             self._view_key, self._id, row_ids, cap, cap_next, table_data
         )
 
-    def to_csv(self, escape_for_excel=False):
+    def to_csv(self, escape_for_excel=False, columns=None, gzip=False):
         return _batcher.flush_and_call(
-            PREFIX + "to_csv", self._cap, escape_for_excel=escape_for_excel
+            PREFIX + "to_csv", self._cap, **csv_kwargs(escape_for_excel, columns, gzip)
         )
 
     # TODO reinclude this API
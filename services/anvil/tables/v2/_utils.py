@@ -282,3 +282,15 @@ def merge_dict_with_compact(row_data, g_row_data, row_cache_spec, g_cache_spec):
             row_data.pop(i)
 
     return row_data
+
+
+def csv_kwargs(escape_for_excel, columns, gzip):
+    # Only send the newer options when they're used
+    kws = {"escape_for_excel": escape_for_excel}
+    if columns is not None:
+        if isinstance(columns, str):
+            columns = [columns]
+        kws["columns"] = list(columns)
+    if gzip:
+        kws["gzip"] = True
+    return kws
@@ -59,11 +59,49 @@ def _resolve_args_kws(fn_name, named_args, default_values, args, kws):
     return resolved
 
 
+if is_server_side():
+    import threading
+
+    class _UserCache(threading.local):
+        # get_user() results for the server call running on this thread, by (allow_remembered, fetch)
+        def __init__(self):
+            self.call_id = None
+            self.users = {}
+
+    _user_cache = _UserCache()
+
+    def _get_user_cache():
+        try:
+            from anvil._threaded_server import call_info
+        except ImportError:
+            return None
+        if call_info.call_id is None:
+            # Not in a server call, so there's nothing to scope the cache to
+            return None
+        if _user_cache.call_id != call_info.call_id:
+            _user_cache.call_id = call_info.call_id
+            _user_cache.users = {}
+        return _user_cache.users
+
+    def _clear_user_cache():
+        _user_cache.call_id = None
+        _user_cache.users = {}
+
+    anvil.server._on_call_complete(_clear_user_cache)
+
+else:
+    def _clear_user_cache():
+        pass
+
+
 #!suggestAttr(anvil.users,login_with_form)!0:
 
 #!defFunction(anvil.users,_,[invalidate_client_objects=False])!2: "Forget the current logged-in user.\n\nIf invalidate_client_objects is true, all live objects (table rows, Capabilities, unfetched Media, etc) will be invalidated" ["logout"]
 def logout(invalidate_client_objects=False):
-    anvil.server.call("anvil.private.users.logout", invalidate_client_objects=invalidate_client_objects)
+    try:
+        anvil.server.call("anvil.private.users.logout", invalidate_client_objects=invalidate_client_objects)
+    finally:
+        _clear_user_cache()
 
 
 anvil.server._register_exception_type("anvil.users.UserExists", UserExists)
@@ -79,13 +117,19 @@ anvil.server._register_exception_type("anvil.users.PasswordResetRequested", Pass
 #!defFunction(anvil.users,_,email,password,[remember=False])!2: "Log in with the specified email address and password. Raises anvil.users.AuthenticationFailed exception if the login failed.\n\nBy default, login status is not remembered between sessions; set remember=True to remember login status." ["login_with_email"]
 def login_with_email(email, password, *args, **kws):
     remember, mfa, fetch = _resolve_args_kws("login_with_email", ["remember", "mfa", "fetch"], [False, None, None], args, kws)
-    u = anvil.server.call("anvil.private.users.login_with_email", email, password, remember=remember, mfa=mfa, fetch=fetch)
+    try:
+        u = anvil.server.call("anvil.private.users.login_with_email", email, password, remember=remember, mfa=mfa, fetch=fetch)
+    finally:
+        _clear_user_cache()
     return _to_user_row(u)
 
 #!defFunction(anvil.users,_,email,password,[remember=False])!2: "Sign up for a new account with the specified email address and password. Raises anvil.users.UserExists if an account is already registered with this email address.\n\nBy default, login status is not remembered between sessions; set remember=True to remember login status." ["signup_with_email"]
 def signup_with_email(email, password, *args, **kws):
     remember, fetch = _resolve_args_kws("signup_with_email", ["remember", "fetch"], [False, None], args, kws)
-    u = anvil.server.call("anvil.private.users.signup_with_email", email, password, remember=remember, fetch=fetch)
+    try:
+        u = anvil.server.call("anvil.private.users.signup_with_email", email, password, remember=remember, fetch=fetch)
+    finally:
+        _clear_user_cache()
     return _to_user_row(u)
 
 #!defFunction(anvil.users,_,email_address)!2: "Send a password-reset email to the specified user" ["send_password_reset_email"]
@@ -104,13 +148,26 @@ def reset_password(old_password, new_password):
 if is_server_side():
     def get_user(*args, **kws):
         allow_remembered, fetch = _resolve_args_kws("get_user", ["allow_remembered", "fetch"], [True, None], args, kws)
-        user = anvil.server.call("anvil.private.users.get_current_user", allow_remembered=allow_remembered, fetch=fetch)
-        return _to_user_row(user)
+        # Within a server call, repeated lookups return the same row (and so share its cached columns)
+        cache = _get_user_cache()
+        key = (bool(allow_remembered), fetch)
+        try:
+            if cache is not None and key in cache:
+                return cache[key]
+        except TypeError:
+            cache = None # unhashable fetch
+        user = _to_user_row(anvil.server.call("anvil.private.users.get_current_user", allow_remembered=allow_remembered, fetch=fetch))
+        if cache is not None:
+            cache[key] = user
+        return user
 
     #!defFunction(anvil.users,_,user_row,[remember=False])!2: "Set the specified user object (a row from a Data Table) as the current logged-in user. It must be a row from the users table. By default, login status is not remembered between sessions." ["force_login"]
     def force_login(user, *args, **kws):
         remember, fetch = _resolve_args_kws("force_login", ["remember", "fetch"], [False, None], args, kws)
-        u = anvil.server.call("anvil.private.users.force_login", _to_row_ref(user), remember=remember, fetch=fetch)
+        try:
+            u = anvil.server.call("anvil.private.users.force_login", _to_row_ref(user), remember=remember, fetch=fetch)
+        finally:
+            _clear_user_cache()
         return _to_user_row(u)
 
     def _fail(fname):
@@ -0,0 +1,127 @@
+import gzip
+import importlib.util
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import anvil
+
+
+# The installed anvil package is the uplink, so load the runtime's anvil/http.py (which has the local client)
+# directly. This test doesn't need an app server.
+def _load_runtime_http():
+    downlink = os.environ.get("DOWNLINK_WORKDIR") or os.path.join(os.path.dirname(__file__), "..", "..", "downlink", "python")
+    spec = importlib.util.spec_from_file_location("runtime_anvil_http", os.path.join(downlink, "anvil", "http.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body, headers=()):
+        self.send_response(status)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _echo(self, body=b""):
+        self.server.client_ports.add(self.client_address[1])
+        echo = {"method": self.command, "path": self.path, "body": body.decode("utf-8"),
+                "content-type": self.headers.get("content-type")}
+        self._reply(200, json.dumps(echo).encode(), [("Content-Type", "application/json")])
+
+    def do_GET(self):
+        if self.path == "/redirect":
+            self._reply(302, b"", [("Location", "/target?from=redirect")])
+        elif self.path == "/gzip":
+            self._reply(200, gzip.compress(b"compressed"), [("Content-Encoding", "gzip")])
+        elif self.path == "/missing":
+            self._reply(404, b"not here")
+        elif self.path.startswith("/slow/"):
+            # Later requests answer sooner
+            time.sleep(0.05 * (5 - int(self.path.split("/")[-1])))
+            self._echo()
+        else:
+            self._echo()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("content-length") or 0))
+        if self.path == "/see-other":
+            self._reply(303, b"", [("Location", "/target")])
+        else:
+            self._echo(body)
+
+
+@pytest.fixture(scope="module")
+def http():
+    module = _load_runtime_http()
+    module.use_local_client()
+    yield module
+    module.use_local_client(False)
+
+
+@pytest.fixture(scope="module")
+def origin():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.client_ports = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(origin, path):
+    return "http://127.0.0.1:%d%s" % (origin.server_port, path)
+
+
+def test_follows_redirects(http, origin):
+    assert http.request(_url(origin, "/redirect"), json=True)["path"] == "/target?from=redirect"
+
+    # 303 turns a POST into a GET without a body
+    response = http.request(_url(origin, "/see-other"), method="POST", data="hello", json=True)
+    assert response["method"] == "GET"
+    assert response["path"] == "/target"
+
+
+def test_decodes_gzip(http, origin):
+    assert http.request(_url(origin, "/gzip")).get_bytes() == b"compressed"
+
+
+def test_raises_http_error(http, origin):
+    with pytest.raises(http.HttpError) as e:
+        http.request(_url(origin, "/missing"))
+    assert e.value.status == 404
+    assert e.value.content.get_bytes() == b"not here"
+
+
+def test_sends_media_body(http, origin):
+    media = anvil.BlobMedia("text/plain", b"media body")
+    response = json.loads(http.request(_url(origin, "/echo"), method="POST", data=media).get_bytes())
+    assert response["body"] == "media body"
+    assert response["content-type"] == "text/plain"
+
+
+def test_reuses_connections(http, origin):
+    origin.client_ports.clear()
+    for i in range(5):
+        http.request(_url(origin, "/echo/%d" % i))
+    assert len(origin.client_ports) == 1
+
+
+def test_request_many_keeps_order(http, origin):
+    paths = ["/slow/%d" % i for i in range(5)]
+    responses = http.request_many([{"url": _url(origin, p), "json": True} for p in paths])
+    assert [r["path"] for r in responses] == paths
+
+    with pytest.raises(http.HttpError):
+        http.request_many([_url(origin, "/echo"), _url(origin, "/missing")])
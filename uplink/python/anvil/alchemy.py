@@ -1,12 +1,56 @@
 import anvil.server
 import json
+import sys
+import threading
 
-from sqlalchemy import inspect
+from sqlalchemy import inspect, tuple_
+from sqlalchemy.orm import selectinload, scoped_session, sessionmaker
 from sqlalchemy.orm.base import NO_VALUE
 
 Base = None
 _s = None
 
+string_type = str if sys.version_info >= (3,) else basestring
+
+
+class _PendingWrites(threading.local):
+    # Writes from __setitem__ in an incoming call are committed once, when the call completes.
+    # This is per thread, so the session must be too (see initialise()).
+    def __init__(self):
+        self.dirty = False
+
+
+_pending = _PendingWrites()
+_parsed_ids = {}
+
+
+def _parse_id(spec_id):
+    # Clients walking objects send the same ids over and over
+    id = _parsed_ids.get(spec_id)
+    if id is None:
+        if len(_parsed_ids) > 1000:
+            _parsed_ids.clear()
+        id = _parsed_ids[spec_id] = json.loads(spec_id)
+    return id
+
+
+def _get_class(name):
+    return Base._decl_class_registry[name]
+
+
+def _load(id):
+    # Objects already in the session's identity map don't need a query
+    return _s.query(_get_class(id["__class__"])).get(id["identity"])
+
+
+def _wrap_related(value, relationships=()):
+    if value is None:
+        return None
+    elif isinstance(value, (list, tuple, set)):
+        return [DBObject.wrap(v, relationships=relationships) for v in value]
+    else:
+        return DBObject.wrap(value, relationships=relationships)
+
 
 @anvil.server.live_object_backend
 class DBObject(anvil.LiveObject):
@@ -16,14 +60,12 @@ class DBObject(anvil.LiveObject):
         if Base is None or _s is None:
             raise Exception("Cannot call __getitem__ before calling anvil.alchemy.initialise")
 
-        id = json.loads(self._spec["id"])
-
-        obj = _s.query(Base._decl_class_registry[id["__class__"]]).get(id["identity"])
+        obj = _load(_parse_id(self._spec["id"]))
 
         result = getattr(obj, name)
 
         if name in obj.__mapper__.relationships:
-            return DBObject.wrap(result)
+            return _wrap_related(result)
         else:
             return result
 
@@ -35,20 +77,37 @@ class DBObject(anvil.LiveObject):
         if self._spec["source"] == "client" and not "w" in self._spec["permissions"]:
             raise Exception("Cannot write this object from the client")
 
-        id = json.loads(self._spec["id"])
-
-        obj = _s.query(Base._decl_class_registry[id["__class__"]]).get(id["identity"])
+        obj = _load(_parse_id(self._spec["id"]))
 
         if isinstance(value, DBObject):
-            val_id = json.loads(value._spec["id"])
-            value = _s.query(eval(val_id["__class__"])).get(val_id["identity"])
+            value = _load(_parse_id(value._spec["id"]))
 
         setattr(obj, name, value)
 
-        _s.commit()
+        if _in_incoming_call():
+            _pending.dirty = True
+        else:
+            # Nothing will commit for us later
+            _commit()
+
+    def __anvil_get_items__(self, keys):
+        # Several items with one lookup. None means all the columns.
+        if Base is None or _s is None:
+            raise Exception("Cannot call __anvil_get_items__ before calling anvil.alchemy.initialise")
+
+        obj = _load(_parse_id(self._spec["id"]))
+        relationships = obj.__mapper__.relationships
+        if keys is None:
+            keys = [c.key for c in obj.__mapper__.column_attrs]
+
+        items = {}
+        for name in keys:
+            value = getattr(obj, name)
+            items[name] = _wrap_related(value) if name in relationships else value
+        return items
 
     @classmethod
-    def wrap(cls, obj, writable=False):
+    def wrap(cls, obj, writable=False, relationships=()):
         pk = inspect(obj).identity
         _class = obj.__class__
 
@@ -62,12 +121,18 @@ class DBObject(anvil.LiveObject):
         for k in attrs.keys():
             v = attrs.get(k)
 
-            if v.loaded_value != NO_VALUE and (isinstance(v.loaded_value, basestring) or
+            if v.loaded_value != NO_VALUE and (isinstance(v.loaded_value, string_type) or
                                                isinstance(v.loaded_value, bool) or
                                                isinstance(v.loaded_value, int) or
                                                isinstance(v.loaded_value, float)):
                 cache[k] = v.loaded_value
 
+        # Eagerly-loaded relationships go in the item cache too, so the client doesn't need to ask for them
+        for k in relationships:
+            v = attrs.get(k)
+            if v is not None and v.loaded_value != NO_VALUE:
+                cache[k] = _wrap_related(v.loaded_value)
+
         if writable:
             permissions = ["w"]
         else:
@@ -77,23 +142,83 @@ class DBObject(anvil.LiveObject):
             "backend": "uplink.DBObject",
             "id": id,
             "permissions": permissions,
-            "methods": ["__getitem__", "__setitem__"],
+            "methods": ["__getitem__", "__setitem__", "__anvil_get_items__"],
             "itemCache": cache
         })
 
 
 def initialise(session_maker, base):
+    """session_maker must give each thread its own session (eg a sqlalchemy scoped_session), because
+    writes are committed or rolled back per incoming call. A sessionmaker is wrapped in a scoped_session."""
     global _s, Base
+    if isinstance(session_maker, sessionmaker):
+        session_maker = scoped_session(session_maker)
     _s = session_maker
     Base = base
 
 
+def _in_incoming_call():
+    try:
+        from anvil._threaded_server import call_info
+    except ImportError:
+        return False
+    return call_info.call_id is not None
+
+
+def _commit():
+    try:
+        _s.commit()
+    except:
+        # Don't leave the session in a failed transaction for the next call
+        _s.rollback()
+        raise
+
+
+def _commit_pending_writes():
+    if not _pending.dirty or _s is None:
+        return
+    _pending.dirty = False
+    if sys.exc_info()[0] is not None:
+        # The call failed
+        _s.rollback()
+    else:
+        _commit()
+
+
+anvil.server._on_call_complete(_commit_pending_writes)
+
+
 @anvil.server.callable
-def get_obj(cls, id):
+def get_obj(cls, id, relationships=None):
     if Base is None or _s is None:
         raise Exception("Cannot call get_obj before calling anvil.alchemy.initialise")
-    obj = _s.query(Base._decl_class_registry[cls]).get(id)
-    return DBObject.wrap(obj)
+    obj = _s.query(_get_class(cls)).get(id)
+    return DBObject.wrap(obj, relationships=relationships or ())
+
+
+@anvil.server.callable
+def get_objs(cls, ids, relationships=None):
+    """Load several objects with one query. Relationships named in `relationships` are loaded alongside
+    them (with selectinload) and sent in their item caches."""
+    if Base is None or _s is None:
+        raise Exception("Cannot call get_objs before calling anvil.alchemy.initialise")
+
+    _class = _get_class(cls)
+    relationships = relationships or ()
+    query = _s.query(_class)
+    if relationships:
+        query = query.options(*[selectinload(getattr(_class, r)) for r in relationships])
+
+    identities = [tuple(i) if isinstance(i, (list, tuple)) else (i,) for i in ids]
+    pk_cols = inspect(_class).primary_key
+    if len(pk_cols) == 1:
+        query = query.filter(pk_cols[0].in_([i[0] for i in identities]))
+    else:
+        query = query.filter(tuple_(*pk_cols).in_(identities))
+
+    by_identity = dict((tuple(inspect(obj).identity), obj) for obj in query.all())
+    return [DBObject.wrap(by_identity[i], relationships=relationships) if i in by_identity else None
+            for i in identities]
 
 
 # org = _s.query(Organisation).get(20)
@@ -58,6 +58,8 @@ from ._server import (register,
                       get_subscriptions,
                       invalidate_client_objects,
                       _on_invalidate_client_objects,
+                      _on_call_complete,
+                      _on_outbound_call,
                       server_method)
 
 _threaded_server.send_reqresp = lambda r, collect_capabilities=None, remote_is_trusted=False: _get_connection().send_reqresp(r, collect_capabilities=collect_capabilities, remote_is_trusted=remote_is_trusted)